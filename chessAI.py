@@ -0,0 +1,981 @@
+"""
+This file is responsible for the AI: searching the game tree for the best move.
+It only depends on chessEngine, so it can be used without the pygame front end.
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from chessEngine import GameState, Move, PIECE_CODES, PROMOTION_PIECES, GEN_CAPTURES, GEN_QUIETS, GEN_ALL
+
+CHECKMATE = 100000  # Being mated scores -CHECKMATE plus the plies from the root, so sooner mates score higher
+STALEMATE = 0
+TABLEBASE_WIN = CHECKMATE // 2  # Won in the tablebases: less the distance to mate, below any mate the search finds
+MATE_SCORE = CHECKMATE - 1000  # Scores beyond this are forced mates
+# Scores beyond this are mates or tablebase wins. They count plies from the root, so the
+# transposition table keeps them relative to the position instead (see scoreToTable)
+WON_SCORE = TABLEBASE_WIN - 1000
+
+# Bound types stored in the transposition table
+EXACT = 0
+LOWER_BOUND = 1  # Search failed high: true score >= stored score
+UPPER_BOUND = 2  # Search failed low: true score <= stored score
+
+# Move ordering
+MAX_PLY = 128
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 24
+KILLER_SCORE = 1 << 22  # Above any history score (those are capped below this)
+ORDER_VALUES = [0, 1, 3, 3, 5, 9, 20, 0] * 2  # Indexed by piece code (code & 7: p N B R Q K)
+# Piece code a promotion flag turns a pawn into (colour does not matter for ordering)
+PROMOTION_CODES = [PIECE_CODES['w' + piece] if piece else 0 for piece in PROMOTION_PIECES]
+
+# Pruning and reductions (see Searcher.negamax)
+NULL_MOVE_REDUCTION = 2  # The null-move search is this many plies shallower, besides the pass itself
+NULL_MOVE_MIN_DEPTH = 3
+LMR_MIN_DEPTH = 3
+LMR_MOVES = 3  # Moves searched at full depth before quiet ones start being reduced
+#------------------------------
+def scoreToTable(score, ply):
+    """
+    A search score at ply as the transposition table keeps it: mate and tablebase
+    scores counted from the position instead of the root
+    """
+    if score > WON_SCORE:
+        return score + ply
+    if score < -WON_SCORE:
+        return score - ply
+    return score
+#------------------------------
+def scoreFromTable(score, ply):
+    """
+    A transposition table score back as a search score at ply
+    """
+    if score > WON_SCORE:
+        return score - ply
+    if score < -WON_SCORE:
+        return score + ply
+    return score
+#------------------------------
+def mvvLva(move):
+    """
+    Ordering score of a capture or promotion: most valuable victim (plus the piece
+    promoted to) first, then least valuable attacker
+    """
+    promoted = ORDER_VALUES[PROMOTION_CODES[(move >> 12) & 7]]
+    return (ORDER_VALUES[(move >> 20) & 15] + promoted) * 64 - ORDER_VALUES[(move >> 16) & 15]
+#------------------------------
+def losesMaterial(gs, move):
+    """
+    Whether a capture loses material: a capture of an equal or bigger piece can't,
+    others are decided by static exchange evaluation
+    """
+    return ORDER_VALUES[(move >> 20) & 15] < ORDER_VALUES[(move >> 16) & 15] and gs.staticExchange(move) < 0
+#------------------------------------------------------------------------------------------------
+class MovePicker():
+    """
+    The moves of a position in stages, each generated only once the stage before it
+    is used up: the hash move, captures and promotions that don't lose material
+    (most valuable victim first), the killer moves, quiet moves by history score,
+    and last the captures that lose material by static exchange evaluation. A cutoff
+    in an early stage saves generating the later ones.
+    """
+    def __init__(self, gs, searcher, ply, hashMove=None):
+        self.gs = gs
+        self.searcher = searcher
+        self.ply = ply
+        self.hashMove = hashMove
+    #------------------------------
+    def __iter__(self):
+        gs = self.gs
+        hash_move = self.hashMove
+        if hash_move is not None:
+            if gs.isLegalMove(hash_move):
+                yield hash_move
+            else:
+                hash_move = None
+
+        generate = self.searcher.generateMoves
+        captures = generate(gs, GEN_CAPTURES)[0]
+        losing = []
+        captures.sort(key=mvvLva, reverse=True)
+        for move in captures:
+            if move == hash_move:
+                continue
+            if losesMaterial(gs, move):
+                losing.append(move)
+                continue
+            yield move
+
+        killers = tuple(move for move in self.searcher.killers[self.ply]
+                        if move is not None and move != hash_move)
+        for move in killers:
+            if gs.isLegalMove(move):
+                yield move
+
+        quiets = generate(gs, GEN_QUIETS)[0]
+        history = self.searcher.history
+        quiets.sort(key=lambda move: history[((move >> 10) & 0x3C0) | ((move >> 6) & 63)], reverse=True)
+        for move in quiets:
+            if move != hash_move and move not in killers:
+                yield move
+
+        yield from losing
+
+#------------------------------------------------------------------------------------------------
+class TranspositionTable():
+    """
+    Fixed-size table of search results keyed by GameState.zobristKey (best moves are packed codes).
+    Every bucket has two slots: the first keeps the deepest result (depth-preferred),
+    the second is always overwritten, so fresh shallow results still get cached.
+    """
+    # Approximate CPython cost of one filled slot: list pointer, entry tuple and its ints
+    ENTRY_BYTES = 8 + sys.getsizeof((0, 0, 0, 0, 0, 0)) + 3 * sys.getsizeof(1 << 63)
+    #------------------------------
+    def __init__(self, sizeMB=16):
+        self.sizeMB = sizeMB
+        self.bucketCount = max(1, sizeMB * 1024 * 1024 // (2 * self.ENTRY_BYTES))
+        self.slots = [None] * (2 * self.bucketCount)
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+    #------------------------------
+    def newSearch(self):
+        """
+        Start a new search: results from older searches become the first to be replaced
+        """
+        self.age = (self.age + 1) & 0xFF
+    #------------------------------
+    def clear(self):
+        """
+        Drop every entry and reset the counters
+        """
+        self.slots = [None] * (2 * self.bucketCount)
+        self.probes = self.hits = self.cutoffs = 0
+    #------------------------------
+    def probe(self, key, depth, alpha, beta, ply=0):
+        """
+        Look up a position searched at ply plies from the root. Returns (score, move):
+        score is None unless the stored result is deep enough and its bound settles
+        the (alpha, beta) window; move is the stored best move, or None on a miss.
+        """
+        self.probes += 1
+        index = 2 * (key % self.bucketCount)
+        entry = self.slots[index]
+        if entry is None or entry[0] != key:
+            entry = self.slots[index + 1]
+            if entry is None or entry[0] != key:
+                return None, None
+        self.hits += 1
+        _, entry_depth, score, bound, move, _ = entry
+        score = scoreFromTable(score, ply)
+        if entry_depth >= depth:
+            if (bound == EXACT or
+                    (bound == LOWER_BOUND and score >= beta) or
+                    (bound == UPPER_BOUND and score <= alpha)):
+                self.cutoffs += 1
+                return score, move
+        return None, move
+    #------------------------------
+    def getMove(self, key):
+        """
+        Stored best move for a position, or None (not counted as a probe)
+        """
+        index = 2 * (key % self.bucketCount)
+        for entry in (self.slots[index], self.slots[index + 1]):
+            if entry is not None and entry[0] == key:
+                return entry[4]
+        return None
+    #------------------------------
+    def store(self, key, depth, score, bound, move, ply=0):
+        """
+        Save a search result found at ply plies from the root, replacing by depth in
+        the first slot of the bucket and unconditionally in the second
+        """
+        index = 2 * (key % self.bucketCount)
+        entry = (key, depth, scoreToTable(score, ply), bound, move, self.age)
+        deepest = self.slots[index]
+        if deepest is None or deepest[0] == key or deepest[1] <= depth or deepest[5] != self.age:
+            self.slots[index] = entry
+        else:
+            self.slots[index + 1] = entry
+    #------------------------------
+    def getStats(self):
+        """
+        Hit and cutoff rates since the table was created or cleared
+        """
+        return {
+            'probes': self.probes,
+            'hits': self.hits,
+            'cutoffs': self.cutoffs,
+            'hitRate': self.hits / self.probes if self.probes else 0.0,
+            'cutoffRate': self.cutoffs / self.probes if self.probes else 0.0,
+        }
+
+#------------------------------------------------------------------------------------------------
+class SearchAborted(Exception):
+    """
+    Raised inside the search when the time or node budget runs out
+    """
+
+#------------------------------------------------------------------------------------------------
+class SearchResult():
+    """
+    Outcome of a search: score (white's point of view), best move code, depth of the
+    last finished iteration, principal variation (codes), nodes and seconds spent,
+    and the SearchStats when the searcher collected them
+    """
+    def __init__(self, score, move, depth, pv, nodes, elapsed):
+        self.score = score
+        self.move = move
+        self.depth = depth
+        self.pv = pv
+        self.nodes = nodes
+        self.elapsed = elapsed
+        self.stats = None
+    #------------------------------
+    def getMove(self):
+        """
+        The best move as a Move object (None when there is no legal move)
+        """
+        return Move.fromCode(self.move) if self.move is not None else None
+
+#------------------------------------------------------------------------------------------------
+class SearchStats():
+    """
+    Where one search's effort went: nodes (quiescence included) and quiescence nodes,
+    beta cutoffs (how many on the first move searched, and null-move cutoffs),
+    transposition table probes, hits and cutoffs, the nodes of every finished
+    iteration and the seconds spent generating moves (getLegalMoves) and evaluating
+    (evaluateBoard). The evaluation time includes the clock reads around each call,
+    which cost about as much as the evaluation itself.
+    """
+    def __init__(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.nullMoveCutoffs = 0
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.ttCutoffs = 0
+        self.iterationNodes = []  # Nodes searched by each finished iteration, depth 1 first
+        self.moveGenTime = 0.0
+        self.evalTime = 0.0
+        self.elapsed = 0.0
+    #------------------------------
+    def timeMoveGeneration(self, gs, kinds=GEN_ALL):
+        """
+        GameState.getLegalMoves, timed
+        """
+        start = time.perf_counter()
+        moves = gs.getLegalMoves(kinds)
+        self.moveGenTime += time.perf_counter() - start
+        return moves
+    #------------------------------
+    def timeEvaluation(self, gs):
+        """
+        GameState.evaluateBoard, timed
+        """
+        start = time.perf_counter()
+        score = gs.evaluateBoard()
+        self.evalTime += time.perf_counter() - start
+        return score
+    #------------------------------
+    def firstMoveCutoffRate(self):
+        """
+        Share of the beta cutoffs made by the first move searched (the move ordering's hit rate)
+        """
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+    #------------------------------
+    def branchingFactors(self):
+        """
+        Effective branching factor of every iteration from depth 2: its nodes over
+        the nodes of the iteration before
+        """
+        nodes = self.iterationNodes
+        return [nodes[i] / max(nodes[i - 1], 1) for i in range(1, len(nodes))]
+    #------------------------------
+    def toDict(self):
+        """
+        The counters and timings, plus the derived rates, as a JSON-ready dict
+        """
+        return {
+            'nodes': self.nodes,
+            'qnodes': self.qnodes,
+            'cutoffs': self.cutoffs,
+            'firstMoveCutoffs': self.firstMoveCutoffs,
+            'firstMoveCutoffRate': round(self.firstMoveCutoffRate(), 4),
+            'nullMoveCutoffs': self.nullMoveCutoffs,
+            'ttProbes': self.ttProbes,
+            'ttHits': self.ttHits,
+            'ttCutoffs': self.ttCutoffs,
+            'iterationNodes': self.iterationNodes,
+            'branchingFactors': [round(factor, 3) for factor in self.branchingFactors()],
+            'moveGenTime': round(self.moveGenTime, 6),
+            'evalTime': round(self.evalTime, 6),
+            'time': round(self.elapsed, 6),
+        }
+
+#------------------------------------------------------------------------------------------------
+class Searcher():
+    """
+    Alpha-beta search with iterative deepening under a time and/or node budget.
+    A searcher keeps its transposition table between moves; call stop() from
+    another thread to end a running search early. With a Tablebase, positions
+    with few pieces left are scored from the tables instead of searched.
+    usePVS, useNullMove and useLMR turn the search techniques on and off, for benchmarking.
+    With collectStats set (or a statsLog file) every search fills in a SearchStats,
+    and writes it to statsLog as one line of JSON.
+    """
+    CHECK_INTERVAL = 1024  # Nodes between clock checks
+    #------------------------------
+    def __init__(self, tt=None, tablebase=None):
+        self.tt = tt
+        self.tablebase = tablebase
+        self.nodes = 0
+        self.deadline = None
+        self.nodeLimit = None
+        self.stopRequested = False
+        self.stopFlag = None  # Optional shared multiprocessing.Value; non-zero also stops the search
+        self.sharedNodes = None  # Optional shared multiprocessing.Value: nodes of all workers, held to nodeLimit
+        self.reportedNodes = 0  # Part of self.nodes already added to sharedNodes
+        self.onIteration = None  # Optional function called with the SearchResult of every finished iteration
+        self.canAbort = False
+        self.pv = []
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [0] * (16 * 64)  # Indexed by piece moved * 64 + end square
+        self.usePVS = True
+        self.useNullMove = True
+        self.useLMR = True
+        # Counted on every search; the timings need collectStats
+        self.qnodes = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.nullMoveCutoffs = 0
+        self.collectStats = False
+        self.statsLog = None  # Optional text file: one JSON line of SearchStats per search
+        self.stats = None  # SearchStats of the last search, when collected
+        # Move generation and evaluation go through these, so timing them costs nothing when it's off
+        self.generateMoves = GameState.getLegalMoves
+        self.evaluate = GameState.evaluateBoard
+    #------------------------------
+    def stop(self):
+        """
+        Ask a running search to return as soon as possible
+        """
+        self.stopRequested = True
+    #------------------------------
+    def iterativeDeepening(self, gs, timeLimit=None, maxDepth=64, nodeLimit=None):
+        """
+        Search depth 1, 2, 3... until maxDepth, the time limit (seconds) or the node
+        budget is reached. An unfinished iteration is thrown away: the result is
+        always the best move of the last iteration that completed. Each iteration
+        tries the previous principal variation first.
+        """
+        start = time.perf_counter()
+        self.nodes = self.qnodes = self.cutoffs = self.firstMoveCutoffs = self.nullMoveCutoffs = 0
+        stats = self.startStats()
+        self.stopRequested = False
+        self.pv = []
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [value >> 1 for value in self.history]  # Old searches count for less
+        self.deadline = start + timeLimit if timeLimit is not None else None
+        self.nodeLimit = nodeLimit
+        if self.tt is not None:
+            self.tt.newSearch()
+        ply_count = len(gs.moveCodeLog)
+
+        score = self.probeTablebase(gs, 0)
+        if score is not None:  # Play the table move: no search needed
+            move = self.tablebase.bestMove(gs, gs.getLegalMoves()[0])
+            if move is not None:
+                result = SearchResult(score, move, 1, [move], self.nodes, time.perf_counter() - start)
+                if self.onIteration is not None:
+                    self.onIteration(result)
+                self.finishStats(stats, gs, result)
+                return result
+
+        result = SearchResult(STALEMATE, None, 0, [], 0, 0.0)
+        for depth in range(1, maxDepth + 1):
+            self.canAbort = depth > 1  # The first iteration always finishes, so there is a move
+            iteration_start = self.nodes
+            try:
+                score, move = self.negamax(gs, depth, 0, float('-inf'), float('inf'), onPV=True)
+            except SearchAborted:
+                while len(gs.moveCodeLog) > ply_count:  # Unwind the moves the search had made
+                    gs.undoMove()
+                break
+            if not gs.whiteToMove:
+                score = -score
+            if stats is not None:
+                stats.iterationNodes.append(self.nodes - iteration_start)
+            self.pv = self.getPrincipalVariation(gs, move, depth)
+            result = SearchResult(score, move, depth, self.pv, self.nodes, time.perf_counter() - start)
+            if self.onIteration is not None:
+                self.onIteration(result)
+            if move is None or abs(score) > MATE_SCORE:  # No legal move, or a forced mate was found
+                break
+            # The next iteration costs several times this one: don't start what can't finish
+            if timeLimit is not None and time.perf_counter() - start > timeLimit / 2:
+                break
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        self.finishStats(stats, gs, result)
+        return result
+    #------------------------------
+    def startStats(self):
+        """
+        A fresh SearchStats when they are wanted, with move generation and evaluation
+        switched to its timed versions; otherwise None and the plain methods
+        """
+        if not self.collectStats and self.statsLog is None:
+            self.generateMoves = GameState.getLegalMoves
+            self.evaluate = GameState.evaluateBoard
+            return None
+        stats = SearchStats()
+        self.generateMoves = stats.timeMoveGeneration
+        self.evaluate = stats.timeEvaluation
+        if self.tt is not None:  # The table counts over its lifetime: keep this search's share
+            stats.ttProbes, stats.ttHits, stats.ttCutoffs = -self.tt.probes, -self.tt.hits, -self.tt.cutoffs
+        return stats
+    #------------------------------
+    def finishStats(self, stats, gs, result):
+        """
+        Fill in the search's counters, attach the stats to the result and log them
+        """
+        if stats is None:
+            return
+        self.generateMoves = GameState.getLegalMoves
+        self.evaluate = GameState.evaluateBoard
+        stats.nodes = self.nodes
+        stats.qnodes = self.qnodes
+        stats.cutoffs = self.cutoffs
+        stats.firstMoveCutoffs = self.firstMoveCutoffs
+        stats.nullMoveCutoffs = self.nullMoveCutoffs
+        if self.tt is not None:
+            stats.ttProbes += self.tt.probes
+            stats.ttHits += self.tt.hits
+            stats.ttCutoffs += self.tt.cutoffs
+        stats.elapsed = result.elapsed
+        result.stats = self.stats = stats
+        if self.statsLog is not None:
+            record = {
+                'fen': gs.getFen(),
+                'depth': result.depth,
+                'score': result.score,
+                'move': result.getMove().getChessNotation() if result.move is not None else None,
+            }
+            record.update(stats.toDict())
+            self.statsLog.write(json.dumps(record) + "\n")
+            self.statsLog.flush()
+    #------------------------------
+    def checkLimits(self):
+        """
+        Raise SearchAborted once the budget is spent
+        """
+        if not self.canAbort:
+            return
+        nodes = self.nodes
+        if self.sharedNodes is not None:
+            nodes = self.reportNodes()
+        if self.stopRequested or (self.nodeLimit is not None and nodes >= self.nodeLimit) or \
+                (self.deadline is not None and time.perf_counter() >= self.deadline) or \
+                (self.stopFlag is not None and self.stopFlag.value):
+            raise SearchAborted()
+    #------------------------------
+    def reportNodes(self):
+        """
+        Add the nodes searched since the last report to sharedNodes; returns the new total
+        """
+        with self.sharedNodes.get_lock():
+            self.sharedNodes.value += self.nodes - self.reportedNodes
+            total = self.sharedNodes.value
+        self.reportedNodes = self.nodes
+        return total
+    #------------------------------
+    def probeTablebase(self, gs, ply):
+        """
+        Score (white's point of view) of a position found in the tablebases, or None.
+        Wins score TABLEBASE_WIN less the plies to mate from the root, so faster wins
+        are preferred.
+        """
+        if self.tablebase is None or \
+                (gs.colorBitboards['w'] | gs.colorBitboards['b']).bit_count() > self.tablebase.maxPieces:
+            return None
+        probed = self.tablebase.probe(gs)
+        if probed is None:
+            return None
+        result, plies = probed
+        score = result * (TABLEBASE_WIN - ply - plies) if result else STALEMATE
+        return score if gs.whiteToMove else -score
+    #------------------------------
+    def getPrincipalVariation(self, gs, move, depth):
+        """
+        Follow the best moves stored in the transposition table from the root
+        """
+        pv = [move] if move is not None else []
+        if self.tt is None or move is None:
+            return pv
+        made = 0
+        seen = {gs.zobristKey}
+        gs.makeMoveCode(move)
+        made += 1
+        while len(pv) < depth and gs.zobristKey not in seen:
+            seen.add(gs.zobristKey)
+            next_move = self.tt.getMove(gs.zobristKey)
+            if next_move is None or not gs.isLegalMove(next_move):
+                break
+            pv.append(next_move)
+            gs.makeMoveCode(next_move)
+            made += 1
+        for _ in range(made):
+            gs.undoMove()
+        return pv
+    #------------------------------
+    def orderMoves(self, moves, ply, hash_move=None):
+        """
+        Sort moves in place, best candidates first: the hash/PV move, then captures
+        and promotions by most valuable victim / least valuable attacker, then the
+        killer moves of this ply, then quiet moves by their history score
+        """
+        killer1, killer2 = self.killers[ply]
+        history = self.history
+
+        def score(move):
+            if move == hash_move:
+                return HASH_MOVE_SCORE
+            if (move >> 20) & 15 or (move >> 12) & 4:  # Capture or promotion (flags 4-7)
+                return CAPTURE_SCORE + mvvLva(move)
+            if move == killer1:
+                return KILLER_SCORE + 1
+            if move == killer2:
+                return KILLER_SCORE
+            return history[((move >> 10) & 0x3C0) | ((move >> 6) & 63)]
+
+        moves.sort(key=score, reverse=True)
+    #------------------------------
+    def recordCutoff(self, move, depth, ply):
+        """
+        Remember a quiet move that caused a beta cutoff as a killer for this ply
+        and credit it in the history table
+        """
+        if (move >> 20) & 15 or (move >> 12) & 4:  # Captures and promotions are ordered anyway
+            return
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        index = ((move >> 10) & 0x3C0) | ((move >> 6) & 63)
+        self.history[index] = min(self.history[index] + depth * depth, KILLER_SCORE - 1)
+    #------------------------------
+    def alphaBeta(self, gs, depth, ply, alpha, beta, maximizing_player):
+        """
+        negamax() with scores and the window from white's point of view, for callers
+        that keep the minimax convention. maximizing_player is the side to move
+        (True for white). Returns (score, best move code or None).
+        """
+        if maximizing_player:
+            return self.negamax(gs, depth, ply, alpha, beta)
+        score, move = self.negamax(gs, depth, ply, -beta, -alpha)
+        return -score, move
+    #------------------------------
+    def negamax(self, gs, depth, ply, alpha, beta, allowNull=True, onPV=False):
+        """
+        Fail-soft alpha-beta on packed move codes, scores from the side to move's
+        point of view. Returns (score, best move code or None).
+        Principal variation search: after the first move the others only have to be
+        proved worse, with a null window at alpha, and are searched again with the
+        full window when they aren't. Null-move pruning: if passing still leaves the
+        side to move at or above beta after a shallower search, the node is cut
+        (never in check or with only pawns left, where passing may be the best move,
+        i.e. zugzwang). Late move reductions: quiet moves ordered late are searched
+        a ply shallower, and again at full depth if they beat alpha. usePVS,
+        useNullMove and useLMR switch each of them off.
+        onPV is True while the moves to this node follow the previous iteration's
+        principal variation; those nodes try its next move first.
+        """
+        self.nodes += 1
+        if self.nodes % self.CHECK_INTERVAL == 0:
+            self.checkLimits()
+        if ply > 0 and self.tablebase is not None:
+            score = self.probeTablebase(gs, ply)
+            if score is not None:
+                return (score if gs.whiteToMove else -score), None
+        if depth <= 0:
+            return self.quiescence(gs, ply, alpha, beta), None
+
+        tt = self.tt
+        alpha_orig = alpha
+        hash_move = None
+        if tt is not None:
+            if ply > 0:
+                score, hash_move = tt.probe(gs.zobristKey, depth, alpha, beta, ply)
+                if score is not None:
+                    return score, hash_move
+            else:  # The root always searches, so it returns a move
+                hash_move = tt.getMove(gs.zobristKey)
+
+        in_check = gs.inCheck()
+        if self.useNullMove and allowNull and ply > 0 and depth >= NULL_MOVE_MIN_DEPTH and not in_check and \
+                abs(beta) < WON_SCORE:
+            color = 'w' if gs.whiteToMove else 'b'
+            pieces = gs.colorBitboards[color] ^ gs.bitboards[color + 'p'] ^ gs.bitboards[color + 'K']
+            evaluation = self.evaluate(gs) if gs.whiteToMove else -self.evaluate(gs)
+            if pieces and evaluation >= beta:
+                gs.makeNullMove()
+                score = -self.negamax(gs, depth - 1 - NULL_MOVE_REDUCTION, ply + 1, -beta, 1 - beta, False)[0]
+                gs.undoNullMove()
+                if score >= beta:
+                    self.nullMoveCutoffs += 1
+                    return beta, None
+
+        # Previous iteration's principal variation first along it, else the table's best move
+        pv_move = self.pv[ply] if onPV and ply < len(self.pv) else None
+        if pv_move is not None:
+            hash_move = pv_move
+        picker = MovePicker(gs, self, ply, hash_move)
+        killers = self.killers[ply]
+        reduce_late = self.useLMR and depth >= LMR_MIN_DEPTH and not in_check
+
+        best_score = float('-inf')
+        best_move = None
+        searched = 0
+        for move in picker:
+            gs.makeMoveCode(move)
+            if searched == 0:
+                score = -self.negamax(gs, depth - 1, ply + 1, -beta, -alpha, True, move == pv_move)[0]
+            else:
+                # Zero window with PVS (scores are whole centipawns), otherwise the full one
+                window = -alpha - 1 if self.usePVS else -beta
+                reduction = 0
+                if reduce_late and searched >= LMR_MOVES and not (move >> 20) & 15 and not (move >> 12) & 4 and \
+                        move != hash_move and move not in killers and not gs.inCheck():
+                    reduction = 1
+                score = -self.negamax(gs, depth - 1 - reduction, ply + 1, window, -alpha)[0]
+                if reduction and score > alpha:  # The reduced search was wrong: full depth
+                    score = -self.negamax(gs, depth - 1, ply + 1, window, -alpha)[0]
+                if self.usePVS and alpha < score < beta:  # Better than the first move: find by how much
+                    score = -self.negamax(gs, depth - 1, ply + 1, -beta, -alpha)[0]
+            gs.undoMove()
+            searched += 1
+            if score > best_score:
+                best_score = score
+                best_move = move
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                self.cutoffs += 1
+                if searched == 1:
+                    self.firstMoveCutoffs += 1
+                self.recordCutoff(move, depth, ply)
+                break
+
+        if best_move is None:  # No legal move
+            best_score = -CHECKMATE + ply if in_check else STALEMATE
+            if tt is not None:
+                tt.store(gs.zobristKey, depth, best_score, EXACT, None, ply)
+            return best_score, None
+
+        if tt is not None:
+            if best_score <= alpha_orig:
+                bound = UPPER_BOUND
+            elif best_score >= beta:
+                bound = LOWER_BOUND
+            else:
+                bound = EXACT
+            tt.store(gs.zobristKey, depth, best_score, bound, best_move, ply)
+        return best_score, best_move
+
+    #------------------------------
+    def quiescence(self, gs, ply, alpha, beta):
+        """
+        Search captures and promotions only, until the position is quiet, so the
+        evaluation never stops in the middle of an exchange. The side to move may
+        stand pat on the static evaluation; captures that lose material by static
+        exchange evaluation are skipped. In check every evasion is searched.
+        Only captures are generated out of check, so stalemates aren't seen here.
+        Scores are from the side to move's point of view, as in negamax().
+        """
+        self.qnodes += 1
+        valid_moves, in_check = self.generateMoves(gs, GEN_CAPTURES)
+        if in_check:
+            valid_moves = self.generateMoves(gs)[0]
+            if not valid_moves:
+                return -CHECKMATE + ply
+        if ply >= MAX_PLY - 1:
+            return self.evaluate(gs) if gs.whiteToMove else -self.evaluate(gs)
+
+        if in_check:
+            best_score = float('-inf')
+        else:
+            # Stand pat: the side to move need not capture
+            best_score = self.evaluate(gs) if gs.whiteToMove else -self.evaluate(gs)
+            if best_score >= beta:
+                return best_score
+            alpha = max(alpha, best_score)
+        self.orderMoves(valid_moves, ply)
+
+        for move in valid_moves:
+            if not in_check and losesMaterial(gs, move):
+                continue
+            self.nodes += 1
+            if self.nodes % self.CHECK_INTERVAL == 0:
+                self.checkLimits()
+            gs.makeMoveCode(move)
+            score = -self.quiescence(gs, ply + 1, -beta, -alpha)
+            gs.undoMove()
+            best_score = max(best_score, score)
+            alpha = max(alpha, score)
+            if alpha >= beta:
+                break
+        return best_score
+
+#------------------------------------------------------------------------------------------------
+# Root splitting: worker processes each search whole root moves on their own copy of
+# the position. The best root score so far (from the side to move's point of view)
+# lives in shared memory and is the alpha bound every new root move starts from.
+#------------------------------------------------------------------------------------------------
+WORKER_SEARCHER = None  # Per worker process, set up by initWorker
+WORKER_BEST = None
+#------------------------------
+def initWorker(best, stopFlag, sharedNodes, ttSizeMB):
+    """
+    Process pool initializer: one Searcher and transposition table per worker
+    """
+    global WORKER_SEARCHER, WORKER_BEST
+    WORKER_SEARCHER = Searcher(TranspositionTable(ttSizeMB))
+    WORKER_SEARCHER.stopFlag = stopFlag
+    WORKER_SEARCHER.sharedNodes = sharedNodes
+    WORKER_BEST = best
+#------------------------------
+def searchRootMove(gs, move, depth, deadline, nodeLimit, pv):
+    """
+    Worker task: search one root move to depth, starting from the shared best score.
+    deadline is wall-clock time.time() seconds (None for no limit); pv is the previous
+    principal variation when move starts it, else empty. nodeLimit is the budget of the
+    whole search, counted across the workers in the shared node counter.
+    Returns (move, score, bound, pv, nodes): score is None if the search was stopped,
+    and only an exact result when it beats bound, the shared best it started from.
+    """
+    searcher = WORKER_SEARCHER
+    searcher.nodes = searcher.reportedNodes = 0
+    searcher.deadline = time.perf_counter() + deadline - time.time() if deadline is not None else None
+    searcher.nodeLimit = nodeLimit
+    searcher.canAbort = True
+    searcher.pv = pv
+    if searcher.stopFlag.value or (nodeLimit is not None and searcher.sharedNodes.value >= nodeLimit):
+        return move, None, None, [], 0
+    sign = 1 if gs.whiteToMove else -1
+    bound = WORKER_BEST.value
+    gs.makeMoveCode(move)
+    try:
+        score = -searcher.negamax(gs, depth - 1, 1, float('-inf'), -bound, True, bool(pv))[0]
+    except SearchAborted:
+        searcher.reportNodes()
+        return move, None, bound, [], searcher.nodes  # gs is this task's own copy: no need to unwind
+    searcher.reportNodes()
+    gs.undoMove()
+    with WORKER_BEST.get_lock():
+        if score > WORKER_BEST.value:
+            WORKER_BEST.value = score
+    return move, score * sign, bound, searcher.getPrincipalVariation(gs, move, depth), searcher.nodes
+
+#------------------------------------------------------------------------------------------------
+class ParallelSearcher():
+    """
+    Iterative deepening with every iteration split over the root moves across
+    worker processes (workers defaults to the number of CPUs). The first move of an
+    iteration is searched alone to get a bound, then the others run in parallel.
+    Same interface as Searcher; call close() to shut the workers down.
+    """
+    def __init__(self, workers=None, ttSizeMB=16):
+        self.workers = workers or multiprocessing.cpu_count()
+        self.ttSizeMB = ttSizeMB  # Per worker
+        self.tt = TranspositionTable(ttSizeMB)  # For the depth 1 search in this process
+        self.best = multiprocessing.Value('d', float('-inf'))
+        self.stopFlag = multiprocessing.Value('b', 0)
+        self.sharedNodes = multiprocessing.Value('q', 0)  # Nodes so far, against the node limit
+        self.pool = None  # Started by the first search
+        self.nodes = 0
+    #------------------------------
+    def stop(self):
+        """
+        Ask a running search to return as soon as possible
+        """
+        self.stopFlag.value = 1
+    #------------------------------
+    def close(self):
+        """
+        Shut down the worker processes
+        """
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+    #------------------------------
+    def iterativeDeepening(self, gs, timeLimit=None, maxDepth=64, nodeLimit=None):
+        """
+        Same as Searcher.iterativeDeepening, with depths 2 and up searched in parallel
+        """
+        start = time.perf_counter()
+        self.stopFlag.value = 0
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.workers, initializer=initWorker,
+                                            initargs=(self.best, self.stopFlag, self.sharedNodes, self.ttSizeMB))
+        deadline = time.time() + timeLimit if timeLimit is not None else None
+
+        # Depth 1 here, so there is always a move to return
+        result = Searcher(self.tt).iterativeDeepening(gs, None, 1)
+        self.nodes = result.nodes
+        root_moves = gs.getLegalMoves()[0]
+        if result.move is not None:
+            root_moves.remove(result.move)
+            root_moves.insert(0, result.move)
+        for depth in range(2, maxDepth + 1):
+            if result.move is None or abs(result.score) > MATE_SCORE or self.stopFlag.value:
+                break
+            if timeLimit is not None and time.perf_counter() - start > timeLimit / 2:
+                break
+            iteration = self.searchRoot(gs, root_moves, depth, deadline, nodeLimit, result.pv)
+            if iteration is None:  # Stopped: keep the last finished iteration
+                break
+            score, root_moves, pv = iteration
+            result = SearchResult(score, pv[0], depth, pv, self.nodes, time.perf_counter() - start)
+        result.nodes = self.nodes
+        result.elapsed = time.perf_counter() - start
+        return result
+    #------------------------------
+    def searchRoot(self, gs, root_moves, depth, deadline, nodeLimit, pv):
+        """
+        One parallel iteration. Returns (score, root moves reordered best first, pv),
+        or None when the iteration was stopped before every root move was searched.
+        """
+        sign = 1 if gs.whiteToMove else -1
+        self.best.value = float('-inf')
+        self.sharedNodes.value = self.nodes  # Every task counts its nodes on top of these
+
+        def submit(move, pv):
+            return self.pool.submit(searchRootMove, gs, move, depth, deadline, nodeLimit, pv)
+
+        # The first (best so far) move alone sets the bound for the rest
+        results = [submit(root_moves[0], pv).result()]
+        if results[0][1] is not None:
+            pending = {submit(move, []) for move in root_moves[1:]}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(future.result() for future in done)
+                if any(future.result()[1] is None for future in done):
+                    self.stopFlag.value = 1  # Out of budget: finish the queued moves quickly
+        self.nodes += sum(nodes for _, _, _, _, nodes in results)
+        if any(score is None for _, score, _, _, _ in results):
+            return None
+
+        # A score is exact only when it beat the bound its move started from
+        best_score, best_pv = None, None
+        for move, score, bound, move_pv, _ in results:
+            if score * sign > bound and (best_score is None or score * sign > best_score * sign):
+                best_score, best_pv = score, move_pv
+        order = {move: score * sign for move, score, _, _, _ in results}
+        root_moves = sorted(root_moves, key=lambda move: (move != best_pv[0], -order[move]))
+        return best_score, root_moves, best_pv
+
+#------------------------------------------------------------------------------------------------
+def minimax(gs, depth, alpha, beta, maximizing_player, tt=None):
+    """
+    Fixed-depth alpha-beta minimax. Scores are from white's point of view.
+    Returns (score, best move as a Move or None); pass a TranspositionTable to reuse
+    results of transposed positions.
+    """
+    score, code = Searcher(tt).alphaBeta(gs, depth, 0, alpha, beta, maximizing_player)
+    return score, (Move.fromCode(code) if code is not None else None)
+#------------------------------
+def findBestMove(gs, timeLimit=None, maxDepth=64, nodeLimit=None, tt=None, tablebase=None):
+    """
+    Iterative deepening search for the side to move within the given budget.
+    Returns a SearchResult.
+    """
+    return Searcher(tt, tablebase).iterativeDeepening(gs, timeLimit, maxDepth, nodeLimit)
+#------------------------------
+def compareSpeedup(fens, depth, workers, out=sys.stdout):
+    """
+    Search every position to a fixed depth on one core and then with the given
+    number of worker processes, printing times and nodes. Returns the overall speedup.
+    """
+    parallel = ParallelSearcher(workers)
+    parallel.iterativeDeepening(GameState(), maxDepth=2)  # Start the workers before timing
+    serial_time = parallel_time = 0.0
+    try:
+        for fen in fens:
+            gs = GameState(fen)
+            single = Searcher(TranspositionTable(16)).iterativeDeepening(gs, maxDepth=depth)
+            multi = parallel.iterativeDeepening(gs, maxDepth=depth)
+            serial_time += single.elapsed
+            parallel_time += multi.elapsed
+            print("%-60s 1 core: %6.2fs %8d nodes   %d workers: %6.2fs %8d nodes   x%.2f" % (
+                fen[:60], single.elapsed, single.nodes, parallel.workers, multi.elapsed, multi.nodes,
+                single.elapsed / max(multi.elapsed, 1e-9)), file=out)
+    finally:
+        parallel.close()
+    speedup = serial_time / max(parallel_time, 1e-9)
+    print("total: 1 core %.2fs, %d workers %.2fs, speedup x%.2f" % (
+        serial_time, parallel.workers, parallel_time, speedup), file=out)
+    return speedup
+#------------------------------
+def compareFeatures(fens, depth, out=sys.stdout):
+    """
+    Search every position to a fixed depth with each of PVS, null-move pruning and
+    late move reductions switched off in turn, then with all three off, printing
+    the nodes, time and best move of each against the full search.
+    Returns {configuration name: (total nodes, total seconds)}.
+    """
+    configurations = [
+        ("all on", {}),
+        ("no PVS", {'usePVS': False}),
+        ("no null move", {'useNullMove': False}),
+        ("no LMR", {'useLMR': False}),
+        ("all off", {'usePVS': False, 'useNullMove': False, 'useLMR': False}),
+    ]
+    totals = {}
+    for fen in fens:
+        print(fen, file=out)
+        for name, switches in configurations:
+            searcher = Searcher(TranspositionTable(16))
+            for attribute, value in switches.items():
+                setattr(searcher, attribute, value)
+            result = searcher.iterativeDeepening(GameState(fen), maxDepth=depth)
+            nodes, elapsed = totals.get(name, (0, 0.0))
+            totals[name] = (nodes + result.nodes, elapsed + result.elapsed)
+            print("  %-14s %9d nodes %7.2fs  score %6d  move %s" % (
+                name, result.nodes, result.elapsed, result.score,
+                Move.fromCode(result.move).getChessNotation() if result.move is not None else "-"), file=out)
+    print("total:", file=out)
+    for name, (nodes, elapsed) in totals.items():
+        print("  %-14s %9d nodes %7.2fs" % (name, nodes, elapsed), file=out)
+    return totals
+#------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parallel search speedup against a single core, or "
+                                                 "the effect of each search technique with --features")
+    parser.add_argument("--fen", help="position to search (default: the perft reference positions)")
+    parser.add_argument("--depth", type=int, default=4, help="fixed search depth")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="worker processes for the parallel search")
+    parser.add_argument("--features", action="store_true",
+                        help="compare searches with PVS, null move and LMR switched off in turn")
+    args = parser.parse_args(argv)
+    if args.fen:
+        fens = [args.fen]
+    else:
+        from chessPerft import REFERENCE_POSITIONS
+        fens = [fen for _, fen, _ in REFERENCE_POSITIONS]
+    if args.features:
+        compareFeatures(fens, args.depth)
+    else:
+        compareSpeedup(fens, args.depth, args.workers)
+    return 0
+#---------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,170 @@
+"""
+Batch analysis: search many positions (one FEN per line) across a pool of worker
+processes and write one JSON object per position.
+
+Usage:
+    python chessBatch.py positions.fen --depth 5 --workers 8 > results.jsonl
+    cat positions.fen | python chessBatch.py --time 0.5 --unordered
+    python chessBatch.py positions.fen --depth 5 --stats    adds each search's SearchStats
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from chessEngine import GameState, Move
+from chessAI import Searcher, TranspositionTable
+
+WORKER_TT = None  # One transposition table per worker process, cleared for every position
+#------------------------------
+def readFens(lines):
+    """
+    FENs from an iterable of lines, skipping blank lines and # comments
+    """
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+#------------------------------
+def analysePosition(fen, depth=4, timeLimit=None, nodeLimit=None, tt=None, stats=False):
+    """
+    Search one position. Returns a dict with the FEN, score (centipawns, white's
+    point of view), best move, principal variation, depth, nodes and seconds (and
+    with stats, the search's SearchStats as a dict), or the FEN and an error
+    message when the FEN can't be read, so one bad position never ends a batch.
+    The loader rejects illegal positions, so an exception from the search is an
+    engine bug and is raised.
+    """
+    try:
+        gs = GameState(fen)
+    except (ValueError, KeyError, IndexError) as e:
+        return {'fen': fen, 'error': str(e) or "bad FEN"}
+    if tt is not None:
+        tt.clear()
+    searcher = Searcher(tt)
+    searcher.collectStats = stats
+    result = searcher.iterativeDeepening(gs, timeLimit, depth, nodeLimit)
+    analysis = {
+        'fen': fen,
+        'score': result.score,
+        'move': result.getMove().getChessNotation() if result.move is not None else None,
+        'pv': [Move.fromCode(code).getChessNotation() for code in result.pv],
+        'depth': result.depth,
+        'nodes': result.nodes,
+        'time': round(result.elapsed, 4),
+    }
+    if stats:
+        analysis['stats'] = result.stats.toDict()
+    return analysis
+#------------------------------
+def analyseChunk(chunk, depth, timeLimit, nodeLimit, ttSizeMB, stats=False):
+    """
+    Worker task: analyse a list of (index, FEN) pairs; every result gets its index
+    """
+    global WORKER_TT
+    if WORKER_TT is None or WORKER_TT.sizeMB != ttSizeMB:
+        WORKER_TT = TranspositionTable(ttSizeMB)
+    results = []
+    for index, fen in chunk:
+        result = analysePosition(fen, depth, timeLimit, nodeLimit, WORKER_TT, stats)
+        result['index'] = index
+        results.append(result)
+    return results
+#------------------------------
+def chunked(fens, chunkSize):
+    """
+    Group an iterable of FENs into lists of (index, FEN) pairs
+    """
+    chunk = []
+    for index, fen in enumerate(fens):
+        chunk.append((index, fen))
+        if len(chunk) == chunkSize:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+#------------------------------
+def analyseStream(fens, depth=4, timeLimit=None, nodeLimit=None, workers=None, chunkSize=8,
+                  ordered=True, maxInFlight=None, ttSizeMB=16, stats=False):
+    """
+    Analyse an iterable of FENs and yield result dicts (see analysePosition, plus
+    'index', the position's number in the input). Chunks of chunkSize positions go
+    to workers processes (default one per CPU); results come in input order, or as
+    soon as each chunk finishes when ordered is False. The input is read lazily and
+    at most maxInFlight chunks (default 2 per worker) are queued or waiting to be
+    yielded at any time, so memory use doesn't grow with the input. With stats every
+    result also carries its search's SearchStats.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    chunks = chunked(fens, chunkSize)
+    if workers <= 1:
+        for chunk in chunks:
+            yield from analyseChunk(chunk, depth, timeLimit, nodeLimit, ttSizeMB, stats)
+        return
+
+    maxInFlight = maxInFlight or 2 * workers
+    with ProcessPoolExecutor(workers) as pool:
+        pending = {}  # Future -> chunk number
+        finished = {}  # Chunk number -> results, held back until the earlier chunks are out
+        submitted = next_out = 0
+        exhausted = False
+        while True:
+            # Keep the pool fed, up to the in-flight limit (waiting results count towards it)
+            while not exhausted and submitted - next_out < maxInFlight:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                    break
+                future = pool.submit(analyseChunk, chunk, depth, timeLimit, nodeLimit, ttSizeMB, stats)
+                pending[future] = submitted
+                submitted += 1
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                number = pending.pop(future)
+                if ordered:
+                    finished[number] = future.result()
+                else:
+                    next_out += 1
+                    yield from future.result()
+            while next_out in finished:
+                yield from finished.pop(next_out)
+                next_out += 1
+#------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse a file of FEN positions, one JSON result per line")
+    parser.add_argument("input", nargs='?', default='-', help="file with one FEN per line (default: stdin)")
+    parser.add_argument("-o", "--output", default='-', help="output file (default: stdout)")
+    parser.add_argument("--depth", type=int, default=4, help="maximum search depth per position")
+    parser.add_argument("--time", type=float, help="seconds per position")
+    parser.add_argument("--nodes", type=int, help="node budget per position")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="worker processes")
+    parser.add_argument("--chunk-size", type=int, default=8, help="positions handed to a worker at a time")
+    parser.add_argument("--unordered", action="store_true", help="write results as they finish, not in input order")
+    parser.add_argument("--stats", action="store_true",
+                        help="add search statistics (cutoffs, TT hits, branching factors, timings) to each result")
+    args = parser.parse_args(argv)
+
+    infile = sys.stdin if args.input == '-' else open(args.input)
+    outfile = sys.stdout if args.output == '-' else open(args.output, 'w')
+    start = time.perf_counter()
+    count = 0
+    try:
+        for result in analyseStream(readFens(infile), args.depth, args.time, args.nodes, args.workers,
+                                    args.chunk_size, not args.unordered, stats=args.stats):
+            outfile.write(json.dumps(result) + "\n")
+            count += 1
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+    elapsed = time.perf_counter() - start
+    print("%d positions in %.2fs (%.1f per second)" % (count, elapsed, count / max(elapsed, 1e-9)), file=sys.stderr)
+    return 0
+#---------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
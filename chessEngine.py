@@ -2,9 +2,413 @@
 This class is responsible for the storing information about the chess board and the pieces on it.
 It also contains methods for moving pieces, checking for valid moves, and checking for checkmate or stalemate.
 """
+import copy
+import random
+import struct
+#------------------------------------------------------------------------------------------------
+# Bitboards
+# Square index is row * 8 + col, so a8 = 0 and h1 = 63, matching board[row][col].
+# Every piece type of each colour is kept as a 64-bit int with one bit per occupied square.
+#------------------------------------------------------------------------------------------------
+WHITE_PIECES = ("wp", "wN", "wB", "wR", "wQ", "wK")
+BLACK_PIECES = ("bp", "bN", "bB", "bR", "bQ", "bK")
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
+                  (1, -2), (1, 2), (2, -1), (2, 1))
+KING_OFFSETS = ((-1, -1), (-1, 0), (-1, 1),
+                (0, -1),          (0, 1),
+                (1, -1),  (1, 0), (1, 1))
+
+
+def stepAttacks(offsets):
+    """
+    Precompute the attack set of a non-sliding piece for every square
+    """
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        attacks = 0
+        for dr, dc in offsets:
+            if 0 <= r + dr < 8 and 0 <= c + dc < 8:
+                attacks |= 1 << ((r + dr) * 8 + c + dc)
+        table.append(attacks)
+    return table
+
+
+def slidingAttacks(sq, occupied, directions):
+    """
+    Walk each ray from sq until the first blocker (the blocker itself is attacked)
+    """
+    r0, c0 = divmod(sq, 8)
+    attacks = 0
+    for dr, dc in directions:
+        r, c = r0 + dr, c0 + dc
+        while 0 <= r < 8 and 0 <= c < 8:
+            bit = 1 << (r * 8 + c)
+            attacks |= bit
+            if occupied & bit:
+                break
+            r += dr
+            c += dc
+    return attacks
+
+
+def occupancyMask(sq, directions):
+    """
+    Squares whose occupancy can change the attacks from sq (board edges never matter)
+    """
+    r0, c0 = divmod(sq, 8)
+    mask = 0
+    for dr, dc in directions:
+        r, c = r0 + dr, c0 + dc
+        while 0 <= r + dr < 8 and 0 <= c + dc < 8:
+            mask |= 1 << (r * 8 + c)
+            r += dr
+            c += dc
+    return mask
+
+
+KNIGHT_ATTACKS = stepAttacks(KNIGHT_OFFSETS)
+KING_ATTACKS = stepAttacks(KING_OFFSETS)
+# Squares a pawn of the given colour standing on sq attacks
+PAWN_ATTACKS = {'w': stepAttacks(((-1, -1), (-1, 1))),
+                'b': stepAttacks(((1, -1), (1, 1)))}
+ROOK_MASKS = [occupancyMask(sq, ROOK_DIRECTIONS) for sq in range(64)]
+BISHOP_MASKS = [occupancyMask(sq, BISHOP_DIRECTIONS) for sq in range(64)]
+# Per-square lookup tables keyed by the masked occupancy. This plays the role of magic
+# bitboards (the dict hash replaces the magic multiply); entries are filled on first use
+# so importing the module stays cheap.
+ROOK_TABLES = [{} for _ in range(64)]
+BISHOP_TABLES = [{} for _ in range(64)]
+
+
+def rookAttacks(sq, occupied):
+    """
+    Rook attacks from sq given the occupied squares
+    """
+    key = occupied & ROOK_MASKS[sq]
+    attacks = ROOK_TABLES[sq].get(key)
+    if attacks is None:
+        attacks = ROOK_TABLES[sq][key] = slidingAttacks(sq, key, ROOK_DIRECTIONS)
+    return attacks
+
+
+def bishopAttacks(sq, occupied):
+    """
+    Bishop attacks from sq given the occupied squares
+    """
+    key = occupied & BISHOP_MASKS[sq]
+    attacks = BISHOP_TABLES[sq].get(key)
+    if attacks is None:
+        attacks = BISHOP_TABLES[sq][key] = slidingAttacks(sq, key, BISHOP_DIRECTIONS)
+    return attacks
+
+
+def lineTables():
+    """
+    BETWEEN[a][b]: squares strictly between a and b; LINE[a][b]: the whole line through both.
+    Both are 0 when a and b do not share a rank, file or diagonal.
+    """
+    between = [[0] * 64 for _ in range(64)]
+    line = [[0] * 64 for _ in range(64)]
+    for sq in range(64):
+        r0, c0 = divmod(sq, 8)
+        for dr, dc in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+            full = slidingAttacks(sq, 0, ((dr, dc), (-dr, -dc))) | (1 << sq)
+            ray = 0
+            r, c = r0 + dr, c0 + dc
+            while 0 <= r < 8 and 0 <= c < 8:
+                between[sq][r * 8 + c] = ray
+                line[sq][r * 8 + c] = full
+                ray |= 1 << (r * 8 + c)
+                r += dr
+                c += dc
+    return between, line
+
+
+BETWEEN, LINE = lineTables()
+FULL_BOARD = (1 << 64) - 1
+NOT_FILE_A = FULL_BOARD ^ sum(1 << (r * 8) for r in range(8))
+NOT_FILE_H = FULL_BOARD ^ sum(1 << (r * 8 + 7) for r in range(8))
+
+#------------------------------------------------------------------------------------------------
+# Zobrist keys: one random 64-bit number per (piece, square), castling rights combination,
+# en passant file and side to move. The seed is fixed so keys are stable across runs.
+#------------------------------------------------------------------------------------------------
+zobrist_random = random.Random(0x5EED)
+ZOBRIST_PIECES = {piece: [zobrist_random.getrandbits(64) for _ in range(64)]
+                  for piece in WHITE_PIECES + BLACK_PIECES}
+ZOBRIST_CASTLING = [zobrist_random.getrandbits(64) for _ in range(16)]  # Indexed by CastleRights bits
+ZOBRIST_ENPASSANT = [zobrist_random.getrandbits(64) for _ in range(8)]  # Indexed by file
+ZOBRIST_BLACK_TO_MOVE = zobrist_random.getrandbits(64)
+PIECES_BY_COLOR = {'w': WHITE_PIECES, 'b': BLACK_PIECES}
+
+#------------------------------------------------------------------------------------------------
+# Evaluation: material plus piece-square tables for the middlegame and the endgame
+# (PeSTO values, in centipawns), blended by game phase. Tables are laid out like the
+# board, a8 first, from white's side; black pieces read the square mirrored (sq ^ 56).
+#------------------------------------------------------------------------------------------------
+MG_VALUES = {'p': 82, 'N': 337, 'B': 365, 'R': 477, 'Q': 1025, 'K': 0}
+EG_VALUES = {'p': 94, 'N': 281, 'B': 297, 'R': 512, 'Q': 936, 'K': 0}
+PHASE_WEIGHTS = {'p': 0, 'N': 1, 'B': 1, 'R': 2, 'Q': 4, 'K': 0}
+MAX_PHASE = 24  # Sum of PHASE_WEIGHTS over the starting pieces
+MG_TABLES = {
+    'p': [
+          0,   0,   0,   0,   0,   0,   0,   0,
+         98, 134,  61,  95,  68, 126,  34, -11,
+         -6,   7,  26,  31,  65,  56,  25, -20,
+        -14,  13,   6,  21,  23,  12,  17, -23,
+        -27,  -2,  -5,  12,  17,   6,  10, -25,
+        -26,  -4,  -4, -10,   3,   3,  33, -12,
+        -35,  -1, -20, -23, -15,  24,  38, -22,
+          0,   0,   0,   0,   0,   0,   0,   0],
+    'N': [
+        -167, -89, -34, -49,  61, -97, -15, -107,
+         -73, -41,  72,  36,  23,  62,   7,  -17,
+         -47,  60,  37,  65,  84, 129,  73,   44,
+          -9,  17,  19,  53,  37,  69,  18,   22,
+         -13,   4,  16,  13,  28,  19,  21,   -8,
+         -23,  -9,  12,  10,  19,  17,  25,  -16,
+         -29, -53, -12,  -3,  -1,  18, -14,  -19,
+        -105, -21, -58, -33, -17, -28, -19,  -23],
+    'B': [
+        -29,   4, -82, -37, -25, -42,   7,  -8,
+        -26,  16, -18, -13,  30,  59,  18, -47,
+        -16,  37,  43,  40,  35,  50,  37,  -2,
+         -4,   5,  19,  50,  37,  37,   7,  -2,
+         -6,  13,  13,  26,  34,  12,  10,   4,
+          0,  15,  15,  15,  14,  27,  18,  10,
+          4,  15,  16,   0,   7,  21,  33,   1,
+        -33,  -3, -14, -21, -13, -12, -39, -21],
+    'R': [
+         32,  42,  32,  51,  63,   9,  31,  43,
+         27,  32,  58,  62,  80,  67,  26,  44,
+         -5,  19,  26,  36,  17,  45,  61,  16,
+        -24, -11,   7,  26,  24,  35,  -8, -20,
+        -36, -26, -12,  -1,   9,  -7,   6, -23,
+        -45, -25, -16, -17,   3,   0,  -5, -33,
+        -44, -16, -20,  -9,  -1,  11,  -6, -71,
+        -19, -13,   1,  17,  16,   7, -37, -26],
+    'Q': [
+        -28,   0,  29,  12,  59,  44,  43,  45,
+        -24, -39,  -5,   1, -16,  57,  28,  54,
+        -13, -17,   7,   8,  29,  56,  47,  57,
+        -27, -27, -16, -16,  -1,  17,  -2,   1,
+         -9, -26,  -9, -10,  -2,  -4,   3,  -3,
+        -14,   2, -11,  -2,  -5,   2,  14,   5,
+        -35,  -8,  11,   2,   8,  15,  -3,   1,
+         -1, -18,  -9,  10, -15, -25, -31, -50],
+    'K': [
+        -65,  23,  16, -15, -56, -34,   2,  13,
+         29,  -1, -20,  -7,  -8,  -4, -38, -29,
+         -9,  24,   2, -16, -20,   6,  22, -22,
+        -17, -20, -12, -27, -30, -25, -14, -36,
+        -49,  -1, -27, -39, -46, -44, -33, -51,
+        -14, -14, -22, -46, -44, -30, -15, -27,
+          1,   7,  -8, -64, -43, -16,   9,   8,
+        -15,  36,  12, -54,   8, -28,  24,  14],
+}
+EG_TABLES = {
+    'p': [
+          0,   0,   0,   0,   0,   0,   0,   0,
+        178, 173, 158, 134, 147, 132, 165, 187,
+         94, 100,  85,  67,  56,  53,  82,  84,
+         32,  24,  13,   5,  -2,   4,  17,  17,
+         13,   9,  -3,  -7,  -7,  -8,   3,  -1,
+          4,   7,  -6,   1,   0,  -5,  -1,  -8,
+         13,   8,   8,  10,  13,   0,   2,  -7,
+          0,   0,   0,   0,   0,   0,   0,   0],
+    'N': [
+        -58, -38, -13, -28, -31, -27, -63, -99,
+        -25,  -8, -25,  -2,  -9, -25, -24, -52,
+        -24, -20,  10,   9,  -1,  -9, -19, -41,
+        -17,   3,  22,  22,  22,  11,   8, -18,
+        -18,  -6,  16,  25,  16,  17,   4, -18,
+        -23,  -3,  -1,  15,  10,  -3, -20, -22,
+        -42, -20, -10,  -5,  -2, -20, -23, -44,
+        -29, -51, -23, -15, -22, -18, -50, -64],
+    'B': [
+        -14, -21, -11,  -8,  -7,  -9, -17, -24,
+         -8,  -4,   7, -12,  -3, -13,  -4, -14,
+          2,  -8,   0,  -1,  -2,   6,   0,   4,
+         -3,   9,  12,   9,  14,  10,   3,   2,
+         -6,   3,  13,  19,   7,  10,  -3,  -9,
+        -12,  -3,   8,  10,  13,   3,  -7, -15,
+        -14, -18,  -7,  -1,   4,  -9, -15, -27,
+        -23,  -9, -23,  -5,  -9, -16,  -5, -17],
+    'R': [
+         13,  10,  18,  15,  12,  12,   8,   5,
+         11,  13,  13,  11,  -3,   3,   8,   3,
+          7,   7,   7,   5,   4,  -3,  -5,  -3,
+          4,   3,  13,   1,   2,   1,  -1,   2,
+          3,   5,   8,   4,  -5,  -6,  -8, -11,
+         -4,   0,  -5,  -1,  -7, -12,  -8, -16,
+         -6,  -6,   0,   2,  -9,  -9, -11,  -3,
+         -9,   2,   3,  -1,  -5, -13,   4, -20],
+    'Q': [
+         -9,  22,  22,  27,  27,  19,  10,  20,
+        -17,  20,  32,  41,  58,  25,  30,   0,
+        -20,   6,   9,  49,  47,  35,  19,   9,
+          3,  22,  24,  45,  57,  40,  57,  36,
+        -18,  28,  19,  47,  31,  34,  39,  23,
+        -16, -27,  15,   6,   9,  17,  10,   5,
+        -22, -23, -30, -16, -16, -23, -36, -32,
+        -33, -28, -22, -43,  -5, -32, -20, -41],
+    'K': [
+        -74, -35, -18, -18, -11,  15,   4, -17,
+        -12,  17,  14,  17,  17,  38,  23,  11,
+         10,  17,  23,  15,  20,  45,  44,  13,
+         -8,  22,  24,  27,  26,  33,  26,   3,
+        -18,  -4,  21,  24,  27,  23,   9, -11,
+        -19,  -3,  11,  21,  23,  16,   7,  -9,
+        -27, -11,   4,  13,  14,   4,  -5, -17,
+        -53, -34, -21, -11, -28, -14, -24, -43],
+}
+#------------------------------
+def pieceSquareScores(values, tables):
+    """
+    Per piece, the signed score (positive for white) of that piece on each square
+    """
+    scores = {}
+    for piece in WHITE_PIECES + BLACK_PIECES:
+        kind = piece[1]
+        if piece[0] == 'w':
+            scores[piece] = [values[kind] + tables[kind][sq] for sq in range(64)]
+        else:
+            scores[piece] = [-(values[kind] + tables[kind][sq ^ 56]) for sq in range(64)]
+    return scores
+
+MG_SCORES = pieceSquareScores(MG_VALUES, MG_TABLES)
+EG_SCORES = pieceSquareScores(EG_VALUES, EG_TABLES)
+PHASES = {piece: PHASE_WEIGHTS[piece[1]] for piece in WHITE_PIECES + BLACK_PIECES}
+# Plain piece values for static exchange evaluation, indexed by piece code (code & 7: p N B R Q K)
+SEE_VALUES = [0, 100, 320, 330, 500, 900, 20000, 0] * 2
+
+#------------------------------------------------------------------------------------------------
+# Packed moves
+# The generators and the search pass moves around as ints:
+#   bits 0-5 start square, 6-11 end square, 12-14 flag,
+#   16-19 piece moved, 20-23 piece captured (PIECE_CODES, 0 = empty)
+#------------------------------------------------------------------------------------------------
+PIECE_NAMES = ["--", "wp", "wN", "wB", "wR", "wQ", "wK", "--",
+               "--", "bp", "bN", "bB", "bR", "bQ", "bK", "--"]
+PIECE_CODES = {name: code for code, name in enumerate(PIECE_NAMES) if name != "--"}
+PIECE_CODES["--"] = 0
+FLAG_NONE = 0
+FLAG_ENPASSANT = 1
+FLAG_CASTLE = 2
+PROMOTION_FLAGS = {'N': 4, 'B': 5, 'R': 6, 'Q': 7}  # Flags 4-7: promotions, one move per piece
+PROMOTION_PIECES = [None, None, None, None, 'N', 'B', 'R', 'Q']  # Indexed by flag
+PROMOTION_SQUARES = 0xFF | (0xFF << 56)  # Ranks 8 and 1
+NULL_MOVE = 0  # Logged for a passed turn (see makeNullMove); no real move has a zero piece moved
+# Which moves getLegalMoves generates
+GEN_CAPTURES = 1  # Captures (en passant included) and promotions
+GEN_QUIETS = 2  # Everything else, castling included
+GEN_ALL = GEN_CAPTURES | GEN_QUIETS
+
+#------------------------------------------------------------------------------------------------
+# Binary positions: a fixed 32-byte record per position (see GameState.getBinary)
+#   occupancy bitboard (8 bytes), the piece code of every occupied square in square
+#   order as 4-bit nibbles, low nibble first (16 bytes, room for 32 pieces), flags
+#   (bit 0 black to move, bits 1-4 castling rights index), en passant square (255 = none),
+#   halfmove clock and fullmove number (2 bytes each), 2 bytes padding. Little-endian.
+#------------------------------------------------------------------------------------------------
+POSITION_STRUCT = struct.Struct("<Q16sBBHH2x")
+NO_ENPASSANT = 255
+# Piece codes of the low and high nibble of every byte value
+NIBBLE_CODES = [(byte & 15, byte >> 4) for byte in range(256)]
+# Evaluation terms and Zobrist keys indexed by piece code * 64 + square, so a record's
+# pieces can be added up without going through their names (zero for non-piece codes)
+CODE_MG_SCORES = [MG_SCORES[name][sq] if name != "--" else 0 for name in PIECE_NAMES for sq in range(64)]
+CODE_EG_SCORES = [EG_SCORES[name][sq] if name != "--" else 0 for name in PIECE_NAMES for sq in range(64)]
+CODE_ZOBRIST = [ZOBRIST_PIECES[name][sq] if name != "--" else 0 for name in PIECE_NAMES for sq in range(64)]
+CODE_PHASES = [PHASES.get(name, 0) for name in PIECE_NAMES]
+
+#------------------------------------------------------------------------------------------------
+# Irreversible state: what undoMove can't get back from the move itself, one packed int
+# per ply on GameState.stateStack (the state from before that ply's move):
+#   bits 0-3 castling rights (K=1, Q=2, k=4, q=8), 4-10 en passant square (NO_SQUARE = none),
+#   11-14 piece captured (PIECE_CODES, 0 = none), 15 and up the halfmove clock
+#------------------------------------------------------------------------------------------------
+NO_SQUARE = 64
+STATE_STACK_SIZE = 256  # Plies allocated up front; the stack doubles if a game runs longer
+# Castling rights kept by a move from or to each square: moving the king or a rook, or
+# capturing a rook on its home square, clears the rights that depend on it
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[56] = 15 ^ 2  # a1
+CASTLING_MASKS[63] = 15 ^ 1  # h1
+CASTLING_MASKS[60] = 15 ^ 3  # e1
+CASTLING_MASKS[0] = 15 ^ 8  # a8
+CASTLING_MASKS[7] = 15 ^ 4  # h8
+CASTLING_MASKS[4] = 15 ^ 12  # e8
+#------------------------------
+# King and rook home squares each castling right needs: (right bit, king, its square, rook, its square)
+CASTLING_HOMES = ((1, "wK", 60, "wR", 63), (2, "wK", 60, "wR", 56), (4, "bK", 4, "bR", 7), (8, "bK", 4, "bR", 0))
+#------------------------------
+def castlingOnBoard(squares, castling):
+    """
+    The castling rights bits, less the rights whose king or rook (squares: 64 piece
+    names, a8 first) isn't on its home square
+    """
+    castling &= 15
+    for bit, king, king_sq, rook, rook_sq in CASTLING_HOMES:
+        if castling & bit and (squares[king_sq] != king or squares[rook_sq] != rook):
+            castling ^= bit
+    return castling
+#------------------------------
+def isSquareAttackedOn(bitboards, sq, occupied, color):
+    """
+    Look outward from sq for an attacker of the given colour among the pieces of
+    bitboards (one per piece name): knight and pawn squares, the king ring, then
+    the first blocker on each slider ray. Builds no moves or lists.
+    """
+    pawn, knight, bishop, rook, queen, king = PIECES_BY_COLOR[color]
+    if KNIGHT_ATTACKS[sq] & bitboards[knight]:
+        return True
+    if PAWN_ATTACKS['b' if color == 'w' else 'w'][sq] & bitboards[pawn]:
+        return True
+    if KING_ATTACKS[sq] & bitboards[king]:
+        return True
+    sliders = bitboards[rook] | bitboards[queen]
+    if sliders and rookAttacks(sq, occupied) & sliders:
+        return True
+    sliders = bitboards[bishop] | bitboards[queen]
+    return bool(sliders and bishopAttacks(sq, occupied) & sliders)
+#------------------------------
+def placementError(squares, whiteToMove, bitboards=None):
+    """
+    Why a board (64 piece names, a8 first) can't be played on, or None when it can:
+    each side needs exactly one king, pawns can't stand on the first or last rank
+    and the side not to move can't be in check. bitboards (one per piece name) are
+    built from squares unless given.
+    """
+    if squares.count("wK") != 1 or squares.count("bK") != 1:
+        return "Each side needs exactly one king"
+    if "wp" in squares[:8] or "bp" in squares[:8] or "wp" in squares[56:] or "bp" in squares[56:]:
+        return "Pawns can't stand on the first or last rank"
+    if bitboards is None:
+        bitboards = {piece: 0 for piece in WHITE_PIECES + BLACK_PIECES}
+        for sq, piece in enumerate(squares):
+            if piece != "--":
+                bitboards[piece] |= 1 << sq
+    occupied = 0
+    for bb in bitboards.values():
+        occupied |= bb
+    king = bitboards['bK' if whiteToMove else 'wK'].bit_length() - 1
+    if isSquareAttackedOn(bitboards, king, occupied, 'w' if whiteToMove else 'b'):
+        return "The side not to move is in check"
+    return None
+
 #------------------------------------------------------------------------------------------------
 class GameState():
-    def __init__(self):
+    __slots__ = ('board', 'moveFunctions', 'whiteToMove', 'castling', 'enpassantSquare', 'halfmoveClock',
+                 'fullmoveNumber', 'moveCodeLog', 'stateStack', 'checkMate', 'staleMate', 'bitboards',
+                 'colorBitboards', 'whiteKingLocation', 'blackKingLocation', 'mgScore', 'egScore', 'phase',
+                 'pieceCodes', 'zobristKey', 'zobristLog')
+    #----------------------------
+    def __init__(self, fen=None):
+        # Starts from the initial position unless given a FEN string or a binary position (getBinary)
         # 8x8 2D list representing the board
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
@@ -26,159 +430,471 @@ class GameState():
         }
         
         self.whiteToMove = True
-        self.movelog= []  # Fixed: Consistent camelCase naming
-        self.whiteKingLocation = (7, 4)
-        self.blackKingLocation = (0, 4)
+        self.enpassantSquare = NO_SQUARE  # Square an en passant capture would land on
+        self.castling = 15  # Castling rights bits: K=1, Q=2, k=4, q=8
+        self.halfmoveClock = 0  # Plies since the last capture or pawn move (fifty-move rule)
+        self.fullmoveNumber = 1  # Starts at 1, goes up after every black move
+        if fen is None:
+            self.syncFromBoard()
+        elif isinstance(fen, str):
+            self.loadFen(fen)
+        else:  # A 32-byte binary position
+            self.loadRecord(*POSITION_STRUCT.unpack_from(fen))
+#----------------------------
+    def syncFromBoard(self):
+        """
+        Rebuild everything derived from the board, side to move, castling rights and
+        en passant square: bitboards, king locations, the logs and the Zobrist key
+        """
+        self.moveCodeLog = []  # Packed moves; see the movelog property
+        self.checkMate = False
+        self.staleMate = False
+        self.stateStack = [0] * STATE_STACK_SIZE  # Packed irreversible state per ply, see above
+        
+        # Bitboards mirroring self.board: one per piece plus one per colour
+        self.bitboards = {piece: 0 for piece in WHITE_PIECES + BLACK_PIECES}
+        self.colorBitboards = {'w': 0, 'b': 0}
+        self.whiteKingLocation = self.blackKingLocation = ()
+        # Evaluation terms, updated by setSquare: see evaluateBoard
+        self.mgScore = self.egScore = self.phase = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != "--":
+                    sq = r * 8 + c
+                    self.bitboards[piece] |= 1 << sq
+                    self.colorBitboards[piece[0]] |= 1 << sq
+                    self.mgScore += MG_SCORES[piece][sq]
+                    self.egScore += EG_SCORES[piece][sq]
+                    self.phase += PHASES[piece]
+                    if piece == "wK":
+                        self.whiteKingLocation = (r, c)
+                    elif piece == "bK":
+                        self.blackKingLocation = (r, c)
+        self.pieceCodes = [PIECE_CODES[piece] for row in self.board for piece in row]
+        
+        # 64-bit position key, updated by makeMove; undoMove pops the previous key
+        self.zobristKey = self.computeZobristKey()
+        self.zobristLog = []
+#----------------------------
+    @property
+    def movelog(self):
+        """
+        Moves made so far, as Move objects built from the packed move log
+        """
+        return [Move.fromCode(code) for code in self.moveCodeLog]
+#----------------------------
+    @property
+    def currentCastlingRight(self):
+        """
+        The castling rights as a CastleRights (a copy: assign to change them)
+        """
+        castling = self.castling
+        return CastleRights(bool(castling & 1), bool(castling & 4), bool(castling & 2), bool(castling & 8))
+
+    @currentCastlingRight.setter
+    def currentCastlingRight(self, rights):
+        self.castling = rights.getIndex()
+#----------------------------
+    @property
+    def enpassantPossible(self):
+        """
+        (row, col) an en passant capture would land on, or () when there is none
+        """
+        sq = self.enpassantSquare
+        return (sq >> 3, sq & 7) if sq != NO_SQUARE else ()
+
+    @enpassantPossible.setter
+    def enpassantPossible(self, square):
+        self.enpassantSquare = square[0] * 8 + square[1] if square else NO_SQUARE
+#----------------------------
+    def loadFen(self, fen):
+        """
+        Set up the position given in Forsyth-Edwards Notation: placement, side to move,
+        castling rights, en passant square and the optional halfmove clock and fullmove number
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: " + fen)
+        try:
+            halfmove = int(fields[4]) if len(fields) > 4 else 0
+            fullmove = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError("Bad move counters in FEN: " + fen)
+        rows = fields[0].split('/')
+        board = []
+        for row in rows:
+            squares = []
+            for ch in row:
+                if ch.isdigit():
+                    squares.extend(["--"] * int(ch))
+                elif ch.upper() in "PNBRQK":
+                    squares.append(('w' if ch.isupper() else 'b') + (ch.upper() if ch not in "Pp" else 'p'))
+                else:
+                    raise ValueError("Bad piece '%s' in FEN: %s" % (ch, fen))
+            board.append(squares)
+        if len(board) != 8 or any(len(squares) != 8 for squares in board):
+            raise ValueError("FEN board must be 8x8: " + fen)
+        if fields[1] not in ('w', 'b'):
+            raise ValueError("Bad side to move in FEN: " + fen)
+        squares = [piece for row in board for piece in row]
+        error = placementError(squares, fields[1] == 'w')
+        if error:
+            raise ValueError("%s: %s" % (error, fen))
+        
+        self.board = board
+        self.whiteToMove = fields[1] == 'w'
+        castling = fields[2]
+        castling = ('K' in castling) | ('Q' in castling) << 1 | ('k' in castling) << 2 | ('q' in castling) << 3
+        self.castling = castlingOnBoard(squares, castling)  # Rights without their king and rook at home are dropped
+        if fields[3] == '-':
+            self.enpassantSquare = NO_SQUARE
+        elif len(fields[3]) == 2 and fields[3][0] in Move.files_to_cols and fields[3][1] in "36":
+            self.enpassantSquare = Move.ranks_to_rows[fields[3][1]] * 8 + Move.files_to_cols[fields[3][0]]
+        else:
+            raise ValueError("Bad en passant square in FEN: " + fen)
+        self.halfmoveClock = halfmove
+        self.fullmoveNumber = fullmove
+        self.syncFromBoard()
+#----------------------------
+    def getFen(self):
+        """
+        The position in Forsyth-Edwards Notation (the inverse of loadFen)
+        """
+        rows = []
+        for row in self.board:
+            text = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                text += piece[1].upper() if piece[0] == 'w' else piece[1].lower()
+            rows.append(text + (str(empty) if empty else ""))
+        castling = "".join(letter for bit, letter in enumerate("KQkq") if self.castling >> bit & 1) or "-"
+        if self.enpassantSquare != NO_SQUARE:
+            enpassant = Move.cols_to_files[self.enpassantSquare & 7] + Move.rows_to_ranks[self.enpassantSquare >> 3]
+        else:
+            enpassant = "-"
+        return "%s %s %s %s %d %d" % ("/".join(rows), 'w' if self.whiteToMove else 'b', castling,
+                                      enpassant, self.halfmoveClock, self.fullmoveNumber)
+#----------------------------
+    def getBinary(self):
+        """
+        The position as a 32-byte record (layout above POSITION_STRUCT); move history is not kept
+        """
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        nibbles = bytearray(16)
+        codes = self.pieceCodes
+        bb = occupied
+        i = 0
+        while bb:
+            lsb = bb & -bb
+            bb ^= lsb
+            if i == 32:
+                raise ValueError("More than 32 pieces can't be stored in a binary position")
+            nibbles[i >> 1] |= codes[lsb.bit_length() - 1] << ((i & 1) << 2)
+            i += 1
+        flags = (0 if self.whiteToMove else 1) | self.castling << 1
+        enpassant = self.enpassantSquare if self.enpassantSquare != NO_SQUARE else NO_ENPASSANT
+        return POSITION_STRUCT.pack(occupied, bytes(nibbles), flags, enpassant,
+                                    min(self.halfmoveClock, 0xFFFF), min(self.fullmoveNumber, 0xFFFF))
+#----------------------------
+    def loadBinary(self, data, offset=0):
+        """
+        Set up the position from the 32-byte record made by getBinary that starts at
+        offset in data (bytes, bytearray, memoryview or mmap; nothing is copied)
+        """
+        self.loadRecord(*POSITION_STRUCT.unpack_from(data, offset))
+#----------------------------
+    def loadRecord(self, occupied, nibbles, flags, enpassant, halfmove, fullmove):
+        """
+        Set up the position from the unpacked fields of a binary record. The bitboards,
+        evaluation terms and Zobrist key are filled in piece by piece as the record
+        is read, instead of being rebuilt from the board by syncFromBoard.
+        """
+        names = PIECE_NAMES
+        squares = ["--"] * 64
+        codes = [0] * 64
+        boards = [0] * 16  # Per piece code
+        mg_score = eg_score = phase = key = 0
+        bb = occupied
+        for byte in nibbles:
+            if not bb:
+                break
+            for code in NIBBLE_CODES[byte]:
+                if not bb:
+                    break
+                lsb = bb & -bb
+                bb ^= lsb
+                sq = lsb.bit_length() - 1
+                index = code << 6 | sq
+                squares[sq] = names[code]
+                codes[sq] = code
+                boards[code] |= lsb
+                mg_score += CODE_MG_SCORES[index]
+                eg_score += CODE_EG_SCORES[index]
+                phase += CODE_PHASES[code]
+                key ^= CODE_ZOBRIST[index]
+        if boards[0] | boards[7] | boards[8] | boards[15]:
+            raise ValueError("Bad piece code in binary position")
+        bitboards = {piece: boards[PIECE_CODES[piece]] for piece in WHITE_PIECES + BLACK_PIECES}
+        error = placementError(squares, not flags & 1, bitboards)
+        if error:
+            raise ValueError(error + " in binary position")
+
+        self.board = [squares[r * 8:r * 8 + 8] for r in range(8)]
+        self.whiteToMove = not flags & 1
+        self.castling = castlingOnBoard(squares, flags >> 1)
+        self.enpassantSquare = enpassant if enpassant != NO_ENPASSANT else NO_SQUARE
+        self.halfmoveClock = halfmove
+        self.fullmoveNumber = fullmove
+        # The rest as syncFromBoard sets it
+        self.moveCodeLog = []
         self.checkMate = False
         self.staleMate = False
-        self.enpassantPossible = ()  # Coordinates for en passant capture
-        self.currentCastlingRight = CastleRights(True, True, True, True)
-        self.castleRightsLog = [CastleRights(
-            self.currentCastlingRight.wks,
-            self.currentCastlingRight.bks,
-            self.currentCastlingRight.wqs,
-            self.currentCastlingRight.bqs)]
+        self.stateStack = [0] * STATE_STACK_SIZE
+        self.bitboards = bitboards
+        self.colorBitboards = {'w': boards[1] | boards[2] | boards[3] | boards[4] | boards[5] | boards[6],
+                               'b': boards[9] | boards[10] | boards[11] | boards[12] | boards[13] | boards[14]}
+        white_king = boards[6].bit_length() - 1
+        black_king = boards[14].bit_length() - 1
+        self.whiteKingLocation = (white_king >> 3, white_king & 7)
+        self.blackKingLocation = (black_king >> 3, black_king & 7)
+        self.mgScore = mg_score
+        self.egScore = eg_score
+        self.phase = phase
+        self.pieceCodes = codes
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        self.zobristKey = key ^ self.castleAndEnpassantKey()
+        self.zobristLog = []
+#----------------------------
+    def copy(self):
+        """
+        Independent copy of the game, history included, so a search can make and
+        undo moves on it while this one is drawn or changed
+        """
+        return copy.deepcopy(self)
+#----------------------------
+    def computeZobristKey(self):
+        """
+        Hash the whole position from scratch (makeMove/undoMove keep it up to date incrementally)
+        """
+        key = 0
+        for piece, bb in self.bitboards.items():
+            while bb:
+                lsb = bb & -bb
+                bb ^= lsb
+                key ^= ZOBRIST_PIECES[piece][lsb.bit_length() - 1]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key ^ self.castleAndEnpassantKey()
+#----------------------------
+    def castleAndEnpassantKey(self):
+        """
+        Zobrist component for the current castling rights and en passant file
+        """
+        key = ZOBRIST_CASTLING[self.castling]
+        if self.enpassantSquare != NO_SQUARE:
+            key ^= ZOBRIST_ENPASSANT[self.enpassantSquare & 7]
+        return key
+#----------------------------
+    def setSquare(self, r, c, piece):
+        """
+        Put piece (or "--") on square (r, c), keeping the bitboards, Zobrist key and
+        evaluation terms in sync with the board
+        """
+        sq = r * 8 + c
+        bit = 1 << sq
+        old = self.board[r][c]
+        if old != "--":
+            self.bitboards[old] ^= bit
+            self.colorBitboards[old[0]] ^= bit
+            self.zobristKey ^= ZOBRIST_PIECES[old][sq]
+            self.mgScore -= MG_SCORES[old][sq]
+            self.egScore -= EG_SCORES[old][sq]
+            self.phase -= PHASES[old]
+        if piece != "--":
+            self.bitboards[piece] |= bit
+            self.colorBitboards[piece[0]] |= bit
+            self.zobristKey ^= ZOBRIST_PIECES[piece][sq]
+            self.mgScore += MG_SCORES[piece][sq]
+            self.egScore += EG_SCORES[piece][sq]
+            self.phase += PHASES[piece]
+        self.board[r][c] = piece
+        self.pieceCodes[sq] = PIECE_CODES[piece]
 #----------------------------
     def makeMove(self, move):
         """
         Execute a move (works for all move types)
         """
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
-        self.movelog.append(move)  # Fixed: Using correct attribute name
+        self.makeMoveCode(move.code)
+#------------------------------
+    def makeMoveCode(self, code):
+        """
+        Execute a move given as a packed int (Move.code); the search calls this directly
+        """
+        start = code & 63
+        end = (code >> 6) & 63
+        flag = (code >> 12) & 7
+        start_row, start_col = start >> 3, start & 7
+        end_row, end_col = end >> 3, end & 7
+        piece_moved = PIECE_NAMES[(code >> 16) & 15]
+        
+        # Save what undoMove can't work out from the move
+        stack = self.stateStack
+        ply = len(self.moveCodeLog)
+        if ply == len(stack):
+            stack.extend([0] * len(stack))
+        stack[ply] = self.castling | self.enpassantSquare << 4 | (code >> 20 & 15) << 11 | self.halfmoveClock << 15
+        
+        self.zobristLog.append(self.zobristKey)
+        self.zobristKey ^= self.castleAndEnpassantKey() ^ ZOBRIST_BLACK_TO_MOVE
+        self.setSquare(start_row, start_col, "--")
+        self.setSquare(end_row, end_col, piece_moved)
+        self.moveCodeLog.append(code)
         self.whiteToMove = not self.whiteToMove
         
         # Update king's position
-        if move.pieceMoved == "wK":
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == "bK":
-            self.blackKingLocation = (move.endRow, move.endCol)
+        if piece_moved == "wK":
+            self.whiteKingLocation = (end_row, end_col)
+        elif piece_moved == "bK":
+            self.blackKingLocation = (end_row, end_col)
             
         # Pawn promotion
-        if move.isPawnPromotion:
-            promotedPiece = input("Promote to Q, R, B, or N: ").upper()
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + promotedPiece
+        if flag & 4:
+            self.setSquare(end_row, end_col, piece_moved[0] + PROMOTION_PIECES[flag])
             
         # En passant
-        if move.isEnpassantMove:
-            self.board[move.startRow][move.endCol] = "--"
+        if flag == FLAG_ENPASSANT:
+            self.setSquare(start_row, end_col, "--")
             
         # Update enpassant possible
-        if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2:
-            self.enpassantPossible = ((move.startRow + move.endRow)//2, move.endCol)
+        if piece_moved[1] == 'p' and abs(start - end) == 16:
+            self.enpassantSquare = (start + end) >> 1
         else:
-            self.enpassantPossible = ()
+            self.enpassantSquare = NO_SQUARE
             
         # Castle move
-        if move.isCastleMove:
-            if move.endCol - move.startCol == 2:  # Kingside
-                self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1]
-                self.board[move.endRow][move.endCol+1] = "--"
+        if flag == FLAG_CASTLE:
+            if end_col - start_col == 2:  # Kingside
+                self.setSquare(end_row, end_col-1, self.board[end_row][end_col+1])
+                self.setSquare(end_row, end_col+1, "--")
             else:  # Queenside
-                self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2]
-                self.board[move.endRow][move.endCol-2] = "--"
+                self.setSquare(end_row, end_col+1, self.board[end_row][end_col-2])
+                self.setSquare(end_row, end_col-2, "--")
         
         # Update castling rights
-        self.updateCastleRights(move)
-        self.castleRightsLog.append(CastleRights(
-            self.currentCastlingRight.wks,
-            self.currentCastlingRight.bks,
-            self.currentCastlingRight.wqs,
-            self.currentCastlingRight.bqs))
+        self.castling &= CASTLING_MASKS[start] & CASTLING_MASKS[end]
+        self.zobristKey ^= self.castleAndEnpassantKey()
+        
+        # Move counters
+        if piece_moved[1] == 'p' or (code >> 20) & 15:
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if self.whiteToMove:  # Black just moved
+            self.fullmoveNumber += 1
+#------------------------------
+    def makeNullMove(self):
+        """
+        Pass the turn without moving (for null-move pruning in the search). The en
+        passant square is cleared; undoMove or undoNullMove takes it back.
+        """
+        ply = len(self.moveCodeLog)
+        if ply == len(self.stateStack):
+            self.stateStack.extend([0] * ply)
+        self.stateStack[ply] = self.castling | self.enpassantSquare << 4 | self.halfmoveClock << 15
+        self.zobristLog.append(self.zobristKey)
+        if self.enpassantSquare != NO_SQUARE:
+            self.zobristKey ^= ZOBRIST_ENPASSANT[self.enpassantSquare & 7]
+            self.enpassantSquare = NO_SQUARE
+        self.zobristKey ^= ZOBRIST_BLACK_TO_MOVE
+        self.moveCodeLog.append(NULL_MOVE)
+        self.whiteToMove = not self.whiteToMove
+        self.halfmoveClock += 1
+        if self.whiteToMove:
+            self.fullmoveNumber += 1
+#------------------------------
+    def undoNullMove(self):
+        """
+        Take back makeNullMove
+        """
+        self.moveCodeLog.pop()
+        state = self.stateStack[len(self.moveCodeLog)]
+        self.enpassantSquare = (state >> 4) & 127
+        self.halfmoveClock = state >> 15
+        if self.whiteToMove:
+            self.fullmoveNumber -= 1
+        self.whiteToMove = not self.whiteToMove
+        self.zobristKey = self.zobristLog.pop()
 #------------------------------
     def undoMove(self):
         """
         Undo the last move
         """
-    def undoMove(self):
-        """Undo the last move"""
-        if len(self.movelog) == 0:  # Fixed: Using correct attribute name
+        if len(self.moveCodeLog) == 0:
+            return
+        if self.moveCodeLog[-1] == NULL_MOVE:
+            self.undoNullMove()
             return
         
-        move = self.movelog.pop()  # Fixed: Using correct attribute name
-        self.board[move.startRow][move.startCol] = move.pieceMoved
-        self.board[move.endRow][move.endCol] = move.pieceCaptured
+        code = self.moveCodeLog.pop()
+        start = code & 63
+        end = (code >> 6) & 63
+        flag = (code >> 12) & 7
+        start_row, start_col = start >> 3, start & 7
+        end_row, end_col = end >> 3, end & 7
+        piece_moved = PIECE_NAMES[(code >> 16) & 15]
+        state = self.stateStack[len(self.moveCodeLog)]
+        piece_captured = PIECE_NAMES[(state >> 11) & 15]
+        self.setSquare(start_row, start_col, piece_moved)
+        self.setSquare(end_row, end_col, piece_captured)
         self.whiteToMove = not self.whiteToMove
         
         # Update king's position
-        if move.pieceMoved == "wK":
-            self.whiteKingLocation = (move.startRow, move.startCol)
-        elif move.pieceMoved == "bK":
-            self.blackKingLocation = (move.startRow, move.startCol)
+        if piece_moved == "wK":
+            self.whiteKingLocation = (start_row, start_col)
+        elif piece_moved == "bK":
+            self.blackKingLocation = (start_row, start_col)
         
         # Undo en passant
-        if move.isEnpassantMove:
-            self.board[move.endRow][move.endCol] = "--"
-            self.board[move.startRow][move.endCol] = move.pieceCaptured
-            self.enpassantPossible = (move.endRow, move.endCol)
+        if flag == FLAG_ENPASSANT:
+            self.setSquare(end_row, end_col, "--")
+            self.setSquare(start_row, end_col, piece_captured)
         
-        # Undo 2 square pawn advance
-        if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2:
-            self.enpassantPossible = ()
-        
-        # Undo castling rights
-        self.castleRightsLog.pop()
-        self.currentCastlingRight = self.castleRightsLog[-1]
+        # Restore the castling rights, en passant square and move counters from before the move
+        self.castling = state & 15
+        self.enpassantSquare = (state >> 4) & 127
+        self.halfmoveClock = state >> 15
+        if not self.whiteToMove:  # Black's move was taken back
+            self.fullmoveNumber -= 1
         
         # Undo castle move
-        if move.isCastleMove:
-            if move.endCol - move.startCol == 2:  # Kingside
-                self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-1]
-                self.board[move.endRow][move.endCol-1] = "--"
+        if flag == FLAG_CASTLE:
+            if end_col - start_col == 2:  # Kingside
+                self.setSquare(end_row, end_col+1, self.board[end_row][end_col-1])
+                self.setSquare(end_row, end_col-1, "--")
             else:  # Queenside
-                self.board[move.endRow][move.endCol-2] = self.board[move.endRow][move.endCol+1]
-                self.board[move.endRow][move.endCol+1] = "--"
-#------------------------------
-    def updateCastleRights(self, move):
-        """
-        Update castling rights based on move
-        """
-        if move.pieceMoved == 'wK':
-            self.currentCastlingRight.wks = False
-            self.currentCastlingRight.wqs = False
-        elif move.pieceMoved == 'bK':
-            self.currentCastlingRight.bks = False
-            self.currentCastlingRight.bqs = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0:
-                    self.currentCastlingRight.wqs = False
-                elif move.startCol == 7:
-                    self.currentCastlingRight.wks = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 0:
-                    self.currentCastlingRight.bqs = False
-                elif move.startCol == 7:
-                    self.currentCastlingRight.bks = False
-
+                self.setSquare(end_row, end_col-2, self.board[end_row][end_col+1])
+                self.setSquare(end_row, end_col+1, "--")
+        
+        # The key from before the move is already on the stack
+        self.zobristKey = self.zobristLog.pop()
+#------------------------------
     def getValidMoves(self):
         """
         Get all valid moves considering checks
         """
-        # Save current state
-        temp_enpassant = self.enpassantPossible
-        temp_castle_rights = CastleRights(
-            self.currentCastlingRight.wks, 
-            self.currentCastlingRight.bks,
-            self.currentCastlingRight.wqs, 
-            self.currentCastlingRight.bqs)
-        
-        # 1) Generate all possible moves
-        moves = self.getAllPossibleMoves()
-        
-        # 2) For each move, make the move
-        for i in range(len(moves)-1, -1, -1):
-            self.makeMove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            if self.inCheck():
-                moves.remove(moves[i])
-            self.whiteToMove = not self.whiteToMove
-            self.undoMove()
-        
-        # 3) Check for checkmate/stalemate
-        if len(moves) == 0:
-            if self.inCheck():
+        codes, in_check = self.getLegalMoves()
+        
+        # Check for checkmate/stalemate
+        if len(codes) == 0:
+            if in_check:
                 self.checkMate = True
             else:
                 self.staleMate = True
@@ -186,147 +902,384 @@ class GameState():
             self.checkMate = False
             self.staleMate = False
         
-        # 4) Add castling moves
-        if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
+        return [Move.fromCode(code) for code in codes]
+#------------------------------
+    def getLegalMoves(self, kinds=GEN_ALL):
+        """
+        Generate only legal moves, without making and undoing them.
+        Checkers and pinned pieces are found once; then every piece is limited to
+        the squares that resolve a check and, if pinned, to its pin ray.
+        kinds picks captures and promotions (GEN_CAPTURES), the other moves
+        (GEN_QUIETS) or both, so a search can ask for the rest only when it needs them.
+        Returns (packed move codes, in_check).
+        """
+        us, them = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        pawn, knight, bishop, rook, queen, king = PIECES_BY_COLOR[us]
+        bb = self.bitboards
+        own = self.colorBitboards[us]
+        enemy = self.colorBitboards[them]
+        occupied = own | enemy
+        king_sq = bb[king].bit_length() - 1
+        moves = []
+        if kinds == GEN_CAPTURES:
+            targets_of_kind, pawn_targets_of_kind = enemy, enemy | PROMOTION_SQUARES
+        elif kinds == GEN_QUIETS:
+            targets_of_kind, pawn_targets_of_kind = ~occupied, ~(enemy | PROMOTION_SQUARES)
+        else:
+            targets_of_kind, pawn_targets_of_kind = ~own, -1
+        
+        # 1) Checkers and the squares that stop a single check
+        checkers = self.attackersTo(king_sq, occupied, them)
+        in_check = checkers != 0
+        if checkers & (checkers - 1):  # Double check: only the king may move
+            allowed = 0
+        elif checkers:
+            allowed = BETWEEN[king_sq][checkers.bit_length() - 1] | checkers
+        else:
+            allowed = ~own
+        
+        # 2) Pinned pieces: an enemy slider on an empty-board ray from the king
+        #    with exactly one of our pieces in between
+        pinned = 0
+        pin_rays = {}
+        enemy_queens = bb[them + 'Q']
+        snipers = ((rookAttacks(king_sq, 0) & (bb[them + 'R'] | enemy_queens)) |
+                   (bishopAttacks(king_sq, 0) & (bb[them + 'B'] | enemy_queens)))
+        while snipers:
+            lsb = snipers & -snipers
+            snipers ^= lsb
+            sniper_sq = lsb.bit_length() - 1
+            blockers = BETWEEN[king_sq][sniper_sq] & occupied
+            if blockers and not blockers & (blockers - 1) and blockers & own:
+                pinned |= blockers
+                pin_rays[blockers.bit_length() - 1] = BETWEEN[king_sq][sniper_sq] | lsb
+        
+        # 3) King moves: the destination must not be attacked once the king has left.
+        #    The attack map is built once and reused for the castling squares below.
+        attacked = self.getAttackedSquares(them, occupied ^ (1 << king_sq))
+        self.addMoves(king_sq, KING_ATTACKS[king_sq] & targets_of_kind & ~attacked, moves)
+        if allowed == 0:
+            return moves, in_check
+        
+        # 4) Knights, bishops, rooks and queens
+        for piece in (knight, bishop, rook, queen):
+            pieces = bb[piece]
+            while pieces:
+                lsb = pieces & -pieces
+                pieces ^= lsb
+                sq = lsb.bit_length() - 1
+                if piece == knight:
+                    if lsb & pinned:  # A pinned knight can never move
+                        continue
+                    targets = KNIGHT_ATTACKS[sq]
+                elif piece == bishop:
+                    targets = bishopAttacks(sq, occupied)
+                elif piece == rook:
+                    targets = rookAttacks(sq, occupied)
+                else:
+                    targets = rookAttacks(sq, occupied) | bishopAttacks(sq, occupied)
+                targets &= allowed & targets_of_kind
+                if lsb & pinned:
+                    targets &= pin_rays[sq]
+                self.addMoves(sq, targets, moves)
+        
+        # 5) Pawns
+        if us == 'w':
+            step, start_row = -8, 6
         else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
+            step, start_row = 8, 1
+        pawn_attacks = PAWN_ATTACKS[us]
+        pawns = bb[pawn]
+        while pawns:
+            lsb = pawns & -pawns
+            pawns ^= lsb
+            sq = lsb.bit_length() - 1
+            targets = pawn_attacks[sq] & enemy
+            push = 1 << (sq + step)
+            if not occupied & push:
+                targets |= push
+                if sq >> 3 == start_row and not occupied & (1 << (sq + 2 * step)):
+                    targets |= 1 << (sq + 2 * step)
+            targets &= allowed & pawn_targets_of_kind
+            if lsb & pinned:
+                targets &= pin_rays[sq]
+            self.addPawnMoves(sq, targets, moves)
+        
+        # 6) En passant: simulate the capture and look for a discovered slider attack,
+        #    which covers pins along the rank that the pin test above cannot see
+        if self.enpassantSquare != NO_SQUARE and kinds & GEN_CAPTURES:
+            ep_sq = self.enpassantSquare
+            captured = 1 << (ep_sq - step)
+            capturers = PAWN_ATTACKS[them][ep_sq] & bb[pawn]
+            ep_code = ep_sq << 6 | FLAG_ENPASSANT << 12 | PIECE_CODES[pawn] << 16 | PIECE_CODES[them + 'p'] << 20
+            while capturers:
+                lsb = capturers & -capturers
+                capturers ^= lsb
+                after = (occupied ^ lsb ^ captured) | (1 << ep_sq)
+                if (self.attackersTo(king_sq, after, them) & ~captured) == 0:
+                    moves.append(ep_code | (lsb.bit_length() - 1))
         
-        # Restore original state
-        self.enpassantPossible = temp_enpassant
-        self.currentCastlingRight = temp_castle_rights
+        # 7) Castling: never out of, through or into check. Lifting the king off the
+        #    board only adds x-rays through its own square, which would mean check.
+        if not in_check and kinds & GEN_QUIETS:
+            rights = self.castling if us == 'w' else self.castling >> 2
+            kingside, queenside = rights & 1, rights & 2
+            castle_code = king_sq | FLAG_CASTLE << 12 | PIECE_CODES[king] << 16
+            if kingside and not occupied & (0b110 << king_sq) and not attacked & (0b110 << king_sq):
+                moves.append(castle_code | (king_sq + 2) << 6)
+            if (queenside and not occupied & (0b111 << (king_sq - 3)) and
+                    not attacked & (0b011 << (king_sq - 2))):
+                moves.append(castle_code | (king_sq - 2) << 6)
         
-        return moves
+        return moves, in_check
+#------------------------------
+    def isLegalMove(self, code):
+        """
+        Is a packed move legal in this position? For moves that come from somewhere
+        else (the transposition table, killer moves) and may belong to another position;
+        much cheaper than generating every move.
+        """
+        start = code & 63
+        end = (code >> 6) & 63
+        flag = (code >> 12) & 7
+        piece = (code >> 16) & 15
+        codes = self.pieceCodes
+        us, them = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        if codes[start] != piece or PIECE_NAMES[piece][0] != us:
+            return False
+        if flag == FLAG_ENPASSANT or flag == FLAG_CASTLE:  # Rare: let the generator decide
+            return code in self.getLegalMoves(GEN_CAPTURES if flag == FLAG_ENPASSANT else GEN_QUIETS)[0]
+        if codes[end] != (code >> 20) & 15:
+            return False
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        end_bit = 1 << end
+        kind = PIECE_NAMES[piece][1]
+        if kind == 'p':
+            if bool(flag & 4) != bool(end_bit & PROMOTION_SQUARES):
+                return False
+            step = -8 if us == 'w' else 8
+            if codes[end]:
+                if not PAWN_ATTACKS[us][start] & end_bit:
+                    return False
+            elif end == start + 2 * step:
+                if start >> 3 != (6 if us == 'w' else 1) or occupied & (1 << (start + step)):
+                    return False
+            elif end != start + step:
+                return False
+        elif flag:
+            return False
+        elif kind == 'N':
+            if not KNIGHT_ATTACKS[start] & end_bit:
+                return False
+        elif kind == 'K':
+            if not KING_ATTACKS[start] & end_bit:
+                return False
+        else:
+            attacks = 0
+            if kind != 'B':
+                attacks |= rookAttacks(start, occupied)
+            if kind != 'R':
+                attacks |= bishopAttacks(start, occupied)
+            if not attacks & end_bit:
+                return False
+        # Pseudo-legal: now the king must not be left in check
+        after = occupied ^ (1 << start) | end_bit
+        king_sq = end if kind == 'K' else self.bitboards[us + 'K'].bit_length() - 1
+        return not self.attackersTo(king_sq, after, them) & ~end_bit
+#------------------------------
+    def attackersTo(self, sq, occupied, color):
+        """
+        Bitboard of the pieces of the given colour that attack sq, with sliders
+        blocked by the given occupancy
+        """
+        pawn, knight, bishop, rook, queen, king = PIECES_BY_COLOR[color]
+        bb = self.bitboards
+        return ((KNIGHT_ATTACKS[sq] & bb[knight]) |
+                (KING_ATTACKS[sq] & bb[king]) |
+                (PAWN_ATTACKS['b' if color == 'w' else 'w'][sq] & bb[pawn]) |
+                (rookAttacks(sq, occupied) & (bb[rook] | bb[queen])) |
+                (bishopAttacks(sq, occupied) & (bb[bishop] | bb[queen])))
+#------------------------------
+    def staticExchange(self, code):
+        """
+        Static exchange evaluation of a capture: the material (centipawns) the moving side
+        ends up with if both sides keep recapturing on the target square with their least
+        valuable attacker and may stop whenever continuing would lose. Sliders lined up
+        behind a capturing piece (x-rays) join in once it has moved.
+        """
+        start = code & 63
+        end = (code >> 6) & 63
+        flag = (code >> 12) & 7
+        occupied = (self.colorBitboards['w'] | self.colorBitboards['b']) ^ (1 << start)
+        if flag == FLAG_ENPASSANT:
+            occupied ^= 1 << ((start & ~7) | (end & 7))
+        gain = [SEE_VALUES[(code >> 20) & 15]]
+        on_square = SEE_VALUES[(code >> 16) & 15]  # Value of the piece that would be taken next
+        if flag & 4:
+            on_square = SEE_VALUES[PIECE_CODES['w' + PROMOTION_PIECES[flag]]]
+            gain[0] += on_square - SEE_VALUES[1]
+        side = 'w' if PIECE_NAMES[(code >> 16) & 15][0] == 'b' else 'b'
+        while True:
+            attackers = self.attackersTo(end, occupied, side) & occupied
+            if not attackers:
+                break
+            for piece in PIECES_BY_COLOR[side]:  # Least valuable attacker first
+                attacker = self.bitboards[piece] & attackers
+                if attacker:
+                    break
+            gain.append(on_square - gain[-1])
+            if max(-gain[-2], gain[-1]) < 0:  # Neither choice here can change the sign of the result
+                gain.pop()
+                break
+            occupied ^= attacker & -attacker
+            on_square = SEE_VALUES[PIECE_CODES[piece]]
+            side = 'w' if side == 'b' else 'b'
+        for d in range(len(gain) - 1, 0, -1):
+            gain[d - 1] = -max(-gain[d - 1], gain[d])
+        return gain[0]
 #------------------------------
     def inCheck(self):
         """
         Check if current player is in check
         """
-        if self.whiteToMove:
-            return self.squareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1])
-        else:
-            return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
+        king = self.bitboards['wK' if self.whiteToMove else 'bK']
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        return self.isSquareAttacked(king.bit_length() - 1, occupied, 'b' if self.whiteToMove else 'w')
 #------------------------------
     def squareUnderAttack(self, r, c):
         """
-        Check if square (r,c) is under attack
+        Check if square (r,c) is under attack by the side not to move
         """
-        self.whiteToMove = not self.whiteToMove  # Switch to opponent's turn
-        opp_moves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove  # Switch back
-        
-        for move in opp_moves:
-            if move.endRow == r and move.endCol == c:
-                return True
-        return False
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        return self.isSquareAttacked(r * 8 + c, occupied, 'b' if self.whiteToMove else 'w')
+#------------------------------
+    def isSquareAttacked(self, sq, occupied, color):
+        """
+        True when a piece of the given colour attacks sq (see isSquareAttackedOn);
+        returns as soon as one attacker is found
+        """
+        return isSquareAttackedOn(self.bitboards, sq, occupied, color)
+#------------------------------
+    def getAttackedSquares(self, color, occupied=None):
+        """
+        Bitboard of every square attacked by the given colour. Compute it once and
+        test squares against it instead of asking squareUnderAttack square by square.
+        """
+        if occupied is None:
+            occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        pawn, knight, bishop, rook, queen, king = PIECES_BY_COLOR[color]
+        bb = self.bitboards
+        pawns = bb[pawn]
+        if color == 'w':
+            attacked = ((pawns & NOT_FILE_A) >> 9) | ((pawns & NOT_FILE_H) >> 7)
+        else:
+            attacked = (((pawns & NOT_FILE_A) << 7) | ((pawns & NOT_FILE_H) << 9)) & FULL_BOARD
+        attacked |= KING_ATTACKS[bb[king].bit_length() - 1] if bb[king] else 0
+        pieces = bb[knight]
+        while pieces:
+            lsb = pieces & -pieces
+            pieces ^= lsb
+            attacked |= KNIGHT_ATTACKS[lsb.bit_length() - 1]
+        pieces = bb[rook] | bb[queen]
+        while pieces:
+            lsb = pieces & -pieces
+            pieces ^= lsb
+            attacked |= rookAttacks(lsb.bit_length() - 1, occupied)
+        pieces = bb[bishop] | bb[queen]
+        while pieces:
+            lsb = pieces & -pieces
+            pieces ^= lsb
+            attacked |= bishopAttacks(lsb.bit_length() - 1, occupied)
+        return attacked
 #------------------------------
     def getAllPossibleMoves(self):
         """
         Get all possible moves without considering checks
         """
         moves = []
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                turn = self.board[r][c][0]
-                if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
-                    piece = self.board[r][c][1]
-                    self.moveFunctions[piece](r, c, moves)
-        return moves
+        for piece in (WHITE_PIECES if self.whiteToMove else BLACK_PIECES):
+            moveFunction = self.moveFunctions[piece[1]]
+            bb = self.bitboards[piece]
+            while bb:  # Visit each piece of this type, lowest square first
+                lsb = bb & -bb
+                bb ^= lsb
+                sq = lsb.bit_length() - 1
+                moveFunction(sq >> 3, sq & 7, moves)
+        return [Move.fromCode(code) for code in moves]
+#------------------------------
+    def addMoves(self, sq, targets, moves, flag=FLAG_NONE):
+        """
+        Append a packed move from sq to every square set in the targets bitboard
+        """
+        codes = self.pieceCodes
+        base = sq | flag << 12 | codes[sq] << 16
+        while targets:
+            lsb = targets & -targets
+            targets ^= lsb
+            end = lsb.bit_length() - 1
+            moves.append(base | end << 6 | codes[end] << 20)
+#------------------------------
+    def addPawnMoves(self, sq, targets, moves):
+        """
+        Like addMoves, but a move onto the last rank becomes four promotions, one per piece
+        """
+        promotions = targets & PROMOTION_SQUARES
+        if promotions:
+            for piece in "QRBN":
+                self.addMoves(sq, promotions, moves, PROMOTION_FLAGS[piece])
+            targets ^= promotions
+        self.addMoves(sq, targets, moves)
 #------------------------------
     def getPawnMoves(self, r, c, moves):
         """
         Get all pawn moves
         """
+        sq = r * 8 + c
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        targets = 0
         if self.whiteToMove:  # White pawn moves
-            if self.board[r-1][c] == "--":  # 1 square move
-                moves.append(Move((r, c), (r-1, c), self.board))
-                if r == 6 and self.board[r-2][c] == "--":  # 2 square move
-                    moves.append(Move((r, c), (r-2, c), self.board))
-            
-            # Captures
-            for d in [-1, 1]:  # Left and right capture
-                if 0 <= c+d < 8:
-                    if self.board[r-1][c+d][0] == 'b':  # Enemy piece
-                        moves.append(Move((r, c), (r-1, c+d), self.board))
-                    elif (r-1, c+d) == self.enpassantPossible:
-                        moves.append(Move((r, c), (r-1, c+d), self.board, isEnpassantMove=True))
-        
+            if not occupied & (1 << (sq - 8)):  # 1 square move
+                targets |= 1 << (sq - 8)
+                if r == 6 and not occupied & (1 << (sq - 16)):  # 2 square move
+                    targets |= 1 << (sq - 16)
+            attacks = PAWN_ATTACKS['w'][sq]
+            enemy = self.colorBitboards['b']
         else:  # Black pawn moves
-            if self.board[r+1][c] == "--":  # 1 square move
-                moves.append(Move((r, c), (r+1, c), self.board))
-                if r == 1 and self.board[r+2][c] == "--":  # 2 square move
-                    moves.append(Move((r, c), (r+2, c), self.board))
-            
-            # Captures
-            for d in [-1, 1]:  # Left and right capture
-                if 0 <= c+d < 8:
-                    if self.board[r+1][c+d][0] == 'w':  # Enemy piece
-                        moves.append(Move((r, c), (r+1, c+d), self.board))
-                    elif (r+1, c+d) == self.enpassantPossible:
-                        moves.append(Move((r, c), (r+1, c+d), self.board, isEnpassantMove=True))
+            if not occupied & (1 << (sq + 8)):  # 1 square move
+                targets |= 1 << (sq + 8)
+                if r == 1 and not occupied & (1 << (sq + 16)):  # 2 square move
+                    targets |= 1 << (sq + 16)
+            attacks = PAWN_ATTACKS['b'][sq]
+            enemy = self.colorBitboards['w']
+        
+        # Captures
+        self.addPawnMoves(sq, targets | (attacks & enemy), moves)
+        if self.enpassantSquare != NO_SQUARE and attacks & (1 << self.enpassantSquare):
+            ep_sq = self.enpassantSquare
+            moves.append(Move((r, c), (ep_sq >> 3, ep_sq & 7), self.board, isEnpassantMove=True).code)
 #------------------------------
     def getRookMoves(self, r, c, moves):
         """
         Get all rook moves
         """
-        directions = ((-1, 0), (1, 0), (0, -1), (0, 1))  # Up, down, left, right
-        enemy_color = 'b' if self.whiteToMove else 'w'
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece == "--":  # Empty space
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                    elif end_piece[0] == enemy_color:  # Enemy piece
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                        break
-                    else:  # Friendly piece
-                        break
-                else:  # Off board
-                    break
+        ally = self.colorBitboards['w' if self.whiteToMove else 'b']
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        self.addMoves(r * 8 + c, rookAttacks(r * 8 + c, occupied) & ~ally, moves)
 #------------------------------
     def getKnightMoves(self, r, c, moves):
         """
         Get all knight moves
         """
-        # Knight moves
-        knight_moves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                    (1, -2), (1, 2), (2, -1), (2, 1))
-        ally_color = 'w' if self.whiteToMove else 'b'
-        # Check each knight move
-        for m in knight_moves:
-            end_row = r + m[0]
-            end_col = c + m[1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:  # Not an ally piece
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
+        ally = self.colorBitboards['w' if self.whiteToMove else 'b']
+        self.addMoves(r * 8 + c, KNIGHT_ATTACKS[r * 8 + c] & ~ally, moves)
 #------------------------------
     def getBishopMoves(self, r, c, moves):
         """
         Get all bishop moves
         """
-        # Bishop moves
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))  # Diagonals
-        enemy_color = 'b' if self.whiteToMove else 'w'
-        # Check each diagonal
-        for d in directions:
-            for i in range(1, 8):
-                end_row = r + d[0] * i
-                end_col = c + d[1] * i
-                if 0 <= end_row < 8 and 0 <= end_col < 8:
-                    end_piece = self.board[end_row][end_col]
-                    if end_piece == "--":  # Empty space
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                    elif end_piece[0] == enemy_color:  # Enemy piece
-                        moves.append(Move((r, c), (end_row, end_col), self.board))
-                        break
-                    else:  # Friendly piece
-                        break
-                else:  # Off board
-                    break
+        ally = self.colorBitboards['w' if self.whiteToMove else 'b']
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        self.addMoves(r * 8 + c, bishopAttacks(r * 8 + c, occupied) & ~ally, moves)
 #------------------------------
     def getQueenMoves(self, r, c, moves):
         """
@@ -340,82 +1293,45 @@ class GameState():
         """
         Get all king moves
         """
-        # King moves
-        king_moves = ((-1, -1), (-1, 0), (-1, 1),
-                    (0, -1),          (0, 1),
-                    (1, -1),  (1, 0), (1, 1))
-        ally_color = 'w' if self.whiteToMove else 'b'
-        # Check each king move
-        for i in range(8):
-            end_row = r + king_moves[i][0]
-            end_col = c + king_moves[i][1]
-            if 0 <= end_row < 8 and 0 <= end_col < 8:
-                end_piece = self.board[end_row][end_col]
-                if end_piece[0] != ally_color:  # Not an ally piece
-                    moves.append(Move((r, c), (end_row, end_col), self.board))
-#------------------------------
-    def getCastleMoves(self, r, c, moves):
-        """
-        Generate all valid castle moves
-        """
-        if self.squareUnderAttack(r, c):
-            return  # Can't castle while in check
-        
-        if (self.whiteToMove and self.currentCastlingRight.wks) or (not self.whiteToMove and self.currentCastlingRight.bks):
-            self.getKingsideCastleMoves(r, c, moves)
-        if (self.whiteToMove and self.currentCastlingRight.wqs) or (not self.whiteToMove and self.currentCastlingRight.bqs):
-            self.getQueensideCastleMoves(r, c, moves)
-#------------------------------
-    def getKingsideCastleMoves(self, r, c, moves):
-        """
-        Check kingside castle moves
-        """
-        if self.board[r][c+1] == "--" and self.board[r][c+2] == "--":
-            if not self.squareUnderAttack(r, c+1) and not self.squareUnderAttack(r, c+2):
-                moves.append(Move((r, c), (r, c+2), self.board, isCastleMove=True))
-#------------------------------
-    def getQueensideCastleMoves(self, r, c, moves):
-        """
-        Check queenside castle moves
-        """
-        if self.board[r][c-1] == "--" and self.board[r][c-2] == "--" and self.board[r][c-3] == "--":
-            if not self.squareUnderAttack(r, c-1) and not self.squareUnderAttack(r, c-2):
-                moves.append(Move((r, c), (r, c-2), self.board, isCastleMove=True))
-
+        ally = self.colorBitboards['w' if self.whiteToMove else 'b']
+        self.addMoves(r * 8 + c, KING_ATTACKS[r * 8 + c] & ~ally, moves)
 #----------------------------------------------------------------------------------------------------------------------------------------------\
     
     def evaluateBoard(self):
         """
-        Basic material evaluation: positive for white, negative for black
+        Material and piece-square evaluation in centipawns: positive for white, negative for black.
+        The middlegame and endgame scores are blended by how much material is left (game phase).
         """
-        piece_values = {
-            'K': 0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'p': 1
-        }
-        score = 0
-        for row in self.board:
-            for square in row:
-                if square != "--":
-                    value = piece_values[square[1]]
-                    score += value if square[0] == 'w' else -value
-        return score
+        phase = min(self.phase, MAX_PHASE)  # Early promotions can push it past the start value
+        return (self.mgScore * phase + self.egScore * (MAX_PHASE - phase)) // MAX_PHASE
     
 #----------------------------------------------------------------------------------------------------------------------------------------------
 class CastleRights():
     """
     Track castling rights for both players
     """
+    __slots__ = ('wks', 'bks', 'wqs', 'bqs')
     #------------------------------
     def __init__(self, wks, bks, wqs, bqs):
         self.wks = wks  # White king side
         self.bks = bks  # Black king side
         self.wqs = wqs  # White queen side
         self.bqs = bqs  # Black queen side
+    #------------------------------
+    def getIndex(self):
+        """
+        Pack the four rights into 0-15 (K=1, Q=2, k=4, q=8)
+        """
+        return self.wks | (self.wqs << 1) | (self.bks << 2) | (self.bqs << 3)
 
 #-------------------------------------------------------------------------------------------------------------------------------------------
 class Move():
     """
-    Store and manage chess moves
+    Store and manage chess moves.
+    A Move is a small view over a packed int (see "Packed moves" above): the engine
+    and the search pass the ints around and only build Move objects for the UI.
     """
+    __slots__ = ('code',)
     ranks_to_rows = {"1": 7, "2": 6, "3": 5, "4": 4,
                     "5": 3, "6": 2, "7": 1, "8": 0}
     rows_to_ranks = {v: k for k, v in ranks_to_rows.items()}
@@ -423,28 +1339,79 @@ class Move():
                     "e": 4, "f": 5, "g": 6, "h": 7}
     cols_to_files = {v: k for k, v in files_to_cols.items()}
 #------------------------------
-    def __init__(self, start_sq, end_sq, board, isEnpassantMove=False, isCastleMove=False):
-        self.startRow = start_sq[0]
-        self.startCol = start_sq[1]
-        self.endRow = end_sq[0]
-        self.endCol = end_sq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        
-        # Pawn promotion
-        self.isPawnPromotion = (self.pieceMoved == 'wp' and self.endRow == 0) or \
-                            (self.pieceMoved == 'bp' and self.endRow == 7)
-        
-        # En passant
-        self.isEnpassantMove = isEnpassantMove
-        if self.isEnpassantMove:
-            self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
-        
-        # Castle move
-        self.isCastleMove = isCastleMove
-        
-        # Move ID
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+    def __init__(self, start_sq, end_sq, board, isEnpassantMove=False, isCastleMove=False, promotionPiece=None):
+        piece_moved = board[start_sq[0]][start_sq[1]]
+        piece_captured = board[end_sq[0]][end_sq[1]]
+        if isEnpassantMove:
+            flag = FLAG_ENPASSANT
+            piece_captured = 'wp' if piece_moved == 'bp' else 'bp'
+        elif isCastleMove:
+            flag = FLAG_CASTLE
+        elif (piece_moved == 'wp' and end_sq[0] == 0) or (piece_moved == 'bp' and end_sq[0] == 7):
+            # promotionPiece is 'Q', 'R', 'B' or 'N'; None means a queen
+            flag = PROMOTION_FLAGS[promotionPiece or 'Q']
+        else:
+            flag = FLAG_NONE
+        self.code = ((start_sq[0] * 8 + start_sq[1]) | (end_sq[0] * 8 + end_sq[1]) << 6 | flag << 12 |
+                     PIECE_CODES[piece_moved] << 16 | PIECE_CODES[piece_captured] << 20)
+#------------------------------
+    @staticmethod
+    def fromCode(code):
+        """
+        Wrap a packed move code without touching the board
+        """
+        move = Move.__new__(Move)
+        move.code = code
+        return move
+#------------------------------
+    @property
+    def startRow(self):
+        return (self.code & 63) >> 3
+
+    @property
+    def startCol(self):
+        return self.code & 7
+
+    @property
+    def endRow(self):
+        return (self.code >> 9) & 7
+
+    @property
+    def endCol(self):
+        return (self.code >> 6) & 7
+
+    @property
+    def pieceMoved(self):
+        return PIECE_NAMES[(self.code >> 16) & 15]
+
+    @property
+    def pieceCaptured(self):
+        return PIECE_NAMES[(self.code >> 20) & 15]
+
+    @property
+    def isPawnPromotion(self):
+        return (self.code >> 12) & 4 != 0  # Flags 4-7
+
+    @property
+    def promotionPiece(self):
+        return PROMOTION_PIECES[(self.code >> 12) & 7]
+
+    @property
+    def isEnpassantMove(self):
+        return (self.code >> 12) & 7 == FLAG_ENPASSANT
+
+    @property
+    def isCastleMove(self):
+        return (self.code >> 12) & 7 == FLAG_CASTLE
+
+    @property
+    def moveID(self):
+        """
+        Start and end squares, plus the piece of a promotion
+        """
+        if self.code & (4 << 12):  # Flags 4-7 carry the promotion piece
+            return self.code & 0x7FFF
+        return self.code & 0xFFF
 #------------------------------
     def __eq__(self, other):
         """
@@ -453,12 +1420,18 @@ class Move():
         if isinstance(other, Move):
             return self.moveID == other.moveID
         return False
+#------------------------------
+    def __hash__(self):
+        return hash(self.moveID)
 #------------------------------
     def getChessNotation(self):
         """
         Get chess notation of the move
         """
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.promotionPiece:
+            notation += self.promotionPiece.lower()
+        return notation
 #------------------------------
     def getRankFile(self, r, c):
         """
@@ -476,3 +1449,22 @@ class Move():
         
         
         
+
+#-------------------------------------------------------------------------------------------------------------------------------------------
+def encodePositions(states):
+    """
+    Pack an iterable of GameStates into one bytes object of 32-byte records
+    """
+    return b"".join(gs.getBinary() for gs in states)
+#------------------------------
+def decodePositions(data):
+    """
+    Yield a GameState for every 32-byte record in data (bytes, bytearray, mmap...),
+    reading each record in place
+    """
+    size = POSITION_STRUCT.size
+    if len(data) % size:
+        raise ValueError("Binary position data must be a multiple of %d bytes" % size)
+    view = memoryview(data)
+    for offset in range(0, len(view), size):
+        yield GameState(view[offset:offset + size])
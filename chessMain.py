@@ -3,8 +3,13 @@ this is the main file for the chess game
 it is responsible for the game loop and user input
 """
 
+import os
+import threading
 import pygame as p
 from chessEngine import GameState, Move
+from chessAI import Searcher, ParallelSearcher, TranspositionTable
+from chessBook import OpeningBook
+from chessTablebase import Tablebase
 import random
 
 # Initialize pygame
@@ -15,6 +20,12 @@ WIDTH = HEIGHT = 512
 DIMENSION = 8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15
+AI_TIME_LIMIT = 2.0  # Seconds the AI may think per move
+AI_MAX_DEPTH = 8
+TT_SIZE_MB = 32  # Memory cap for the AI's transposition table
+BOOK_PATH = "book.bin"  # Opening book (see chessBook.py); the AI plays from it while it can
+TABLEBASE_DIR = "tablebases"  # Endgame tables (see chessTablebase.py); used by the single-process AI
+AI_WORKERS = 1  # Processes the AI searches with; more than 1 splits the root moves between them
 IMAGES = {}  # Dictionary to store piece images
 
 # Colors
@@ -51,69 +62,188 @@ def drawBoard(screen):
         for col in range(DIMENSION):
             color = colors[(row + col) % 2]
             p.draw.rect(screen, color, p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-#------------------------------
-def drawPieces(screen, board):
-    """
-    Draw chess pieces on board
-    """
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
-            piece = board[row][col]
-            if piece != "--":
-                screen.blit(IMAGES[piece], p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-#------------------------------
-def highlightSquares(screen, gs, valid_moves, sq_selected):
+
+#------------------------------------------------------------------------------------------------
+class BoardRenderer():
     """
-    Highlight selected square and valid moves
+    Draw the board by dirty rectangles: the empty board is rendered once, each frame
+    only the squares whose piece or highlight changed are repainted, and only their
+    rectangles are sent to the display
     """
-    if sq_selected:
-        row, col = sq_selected
-        if gs.board[row][col][0] == ('w' if gs.whiteToMove else 'b'):
-            # Highlight selected square
+    def __init__(self, screen):
+        self.screen = screen
+        self.background = p.Surface((WIDTH, HEIGHT))
+        drawBoard(self.background)
+        self.highlights = [None]
+        for color in ('blue', 'yellow'):  # 1: selected square, 2: its moves
             s = p.Surface((SQ_SIZE, SQ_SIZE))
             s.set_alpha(100)
-            s.fill(p.Color('blue'))
-            screen.blit(s, (col * SQ_SIZE, row * SQ_SIZE))
-            
-            # Highlight valid moves
-            s.fill(p.Color('yellow'))
-            for move in valid_moves:
-                if move.startRow == row and move.startCol == col:
-                    screen.blit(s, (move.endCol * SQ_SIZE, move.endRow * SQ_SIZE))
+            s.fill(p.Color(color))
+            self.highlights.append(s)
+        self.invalidate()
+    #------------------------------
+    def invalidate(self):
+        """
+        Forget what is on screen, so the next render repaints everything
+        """
+        self.shown = [[None] * DIMENSION for _ in range(DIMENSION)]  # (piece, highlight) drawn on each square
+        self.overlay = None  # (draw function, arguments...) of the text over the board
+        self.overlayRect = None
+        self.fullRedraw = True
+    #------------------------------
+    def drawSquare(self, row, col, piece, highlight):
+        """
+        Repaint one square from the cached board, with its highlight and piece.
+        Returns its rectangle.
+        """
+        rect = p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+        self.screen.blit(self.background, rect, rect)
+        if highlight:
+            self.screen.blit(self.highlights[highlight], rect)
+        if piece != "--":
+            self.screen.blit(IMAGES[piece], rect)
+        self.shown[row][col] = (piece, highlight)
+        return rect
+    #------------------------------
+    def squaresUnder(self, rect):
+        """
+        (row, col) of the squares a rectangle overlaps
+        """
+        if rect is None:
+            return set()
+        rows = range(max(rect.top // SQ_SIZE, 0), min((rect.bottom - 1) // SQ_SIZE, DIMENSION - 1) + 1)
+        cols = range(max(rect.left // SQ_SIZE, 0), min((rect.right - 1) // SQ_SIZE, DIMENSION - 1) + 1)
+        return {(row, col) for row in rows for col in cols}
+    #------------------------------
+    def render(self, gs, valid_moves, sq_selected, overlay=None):
+        """
+        Bring the screen up to date: the pieces, the selected square and its moves, and
+        overlay, a (draw function, arguments...) tuple for text drawn over the board
+        whose function returns the rectangle it drew in
+        """
+        highlights = {}
+        if sq_selected:
+            row, col = sq_selected
+            if gs.board[row][col][0] == ('w' if gs.whiteToMove else 'b'):
+                highlights[sq_selected] = 1
+                for move in valid_moves:
+                    if move.startRow == row and move.startCol == col:
+                        highlights[(move.endRow, move.endCol)] = 2
+        wanted = [[(gs.board[row][col], highlights.get((row, col), 0)) for col in range(DIMENSION)]
+                  for row in range(DIMENSION)]
+        changed = {(row, col) for row in range(DIMENSION) for col in range(DIMENSION)
+                   if wanted[row][col] != self.shown[row][col]}
+        # Text is drawn over squares, so a change under it means repainting all of it
+        redraw_overlay = overlay != self.overlay or self.fullRedraw
+        under = self.squaresUnder(self.overlayRect)
+        if under and (redraw_overlay or changed & under):
+            changed |= under
+            redraw_overlay = True
+        rects = [self.drawSquare(row, col, *wanted[row][col]) for row, col in changed]
+        if redraw_overlay:
+            self.overlayRect = overlay[0](self.screen, *overlay[1:]) if overlay else None
+            if self.overlayRect:
+                rects.append(self.overlayRect)
+        self.overlay = overlay
+        self.fullRedraw = False
+        if rects:
+            p.display.update(rects)
+    #------------------------------
+    def choosePromotion(self, color, col, clock):
+        """
+        Show the four promotion pieces down from the promotion square and wait for a
+        click on one of them. Returns 'Q', 'R', 'B' or 'N'.
+        """
+        pieces = "QRBN"
+        rows = range(4) if color == 'w' else range(7, 3, -1)
+        rects = []
+        for row, piece in zip(rows, pieces):
+            rect = p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+            p.draw.rect(self.screen, GRAY, rect)
+            self.screen.blit(IMAGES[color + piece], rect)
+            self.shown[row][col] = None  # Repainted by the next render
+            rects.append(rect)
+        p.display.update(rects)
+        while True:
+            for e in p.event.get():
+                if e.type == p.QUIT:
+                    p.event.post(e)  # Leave it for the main loop
+                    return 'Q'
+                if e.type == p.MOUSEBUTTONDOWN:
+                    for rect, piece in zip(rects, pieces):
+                        if rect.collidepoint(e.pos):
+                            return piece
+            clock.tick(MAX_FPS)
+    #------------------------------
+    def animateMove(self, move, clock):
+        """
+        Slide the moved piece from its start to its end square (the move is already
+        made on the board), repainting only the sprite's old and new rectangles
+        """
+        captured = "--" if move.isEnpassantMove else move.pieceCaptured
+        rects = [self.drawSquare(move.startRow, move.startCol, "--", 0),
+                 self.drawSquare(move.endRow, move.endCol, captured, 0)]
+        path = rects[0].union(rects[1])
+        under = self.screen.subsurface(path).copy()  # What the sprite passes over
+        d_row = move.endRow - move.startRow
+        d_col = move.endCol - move.startCol
+        frames = 10  # Animation frames
+        previous = None
+        for frame in range(frames + 1):
+            r, c = (move.startRow + d_row * frame/frames, move.startCol + d_col * frame/frames)
+            sprite = p.Rect(int(c * SQ_SIZE), int(r * SQ_SIZE), SQ_SIZE, SQ_SIZE)
+            if previous:
+                self.screen.blit(under, previous, previous.move(-path.x, -path.y))
+                rects.append(previous)
+            self.screen.blit(IMAGES[move.pieceMoved], sprite)
+            rects.append(sprite)
+            p.display.update(rects)
+            rects = []
+            previous = sprite
+            clock.tick(60)
+
+#------------------------------------------------------------------------------------------------
+def drawEndGameText(screen, text):
+    """
+    Display game over text
+    """
+    font = p.font.SysFont("Helvetica", 32, True)
+    text_surface = font.render(text, True, p.Color("red"))
+    text_rect = text_surface.get_rect()
+    text_rect.center = (WIDTH // 2, HEIGHT // 2)
+    return screen.blit(text_surface, text_rect)
 #------------------------------
-def drawGameState(screen, gs, valid_moves, sq_selected):
+def drawThinkingText(screen):
     """
-    Draw complete game state
+    Show that the AI is searching
     """
-    drawBoard(screen)
-    highlightSquares(screen, gs, valid_moves, sq_selected)
-    drawPieces(screen, gs.board)
+    font = p.font.SysFont("Helvetica", 20, True)
+    text_surface = font.render("Thinking...", True, p.Color("red"))
+    return screen.blit(text_surface, (WIDTH - text_surface.get_width() - 8, 8))
 #------------------------------
-def animateMove(move, screen, board, clock):
+def startAISearch(searcher, gs):
     """
-    Animate piece movement
+    Search a copy of gs in a background thread so the window keeps handling events.
+    Returns the job dict; its 'move' is set and 'done' turns True when the search ends.
     """
-    d_row = move.endRow - move.startRow
-    d_col = move.endCol - move.startCol
-    frames = 10  # Animation frames
-    for frame in range(frames + 1):
-        r, c = (move.startRow + d_row * frame/frames, move.startCol + d_col * frame/frames)
-        drawBoard(screen)
-        drawPieces(screen, board)
-        # Draw moving piece
-        screen.blit(IMAGES[move.pieceMoved], p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-        p.display.flip()
-        clock.tick(60)
+    job = {'move': None, 'done': False, 'key': gs.zobristKey, 'ply': len(gs.moveCodeLog)}
+    position = gs.copy()  # The search makes and undoes moves on its own copy
+    
+    def run():
+        job['move'] = searcher.iterativeDeepening(position, AI_TIME_LIMIT, AI_MAX_DEPTH).getMove()
+        job['done'] = True
+    
+    job['thread'] = threading.Thread(target=run, daemon=True)
+    job['thread'].start()
+    return job
 #------------------------------
-def drawEndGameText(screen, text):
+def stopAISearch(searcher, job):
     """
-    Display game over text
+    Cancel a running search and wait for its thread, so the searcher is free for the next one
     """
-    font = p.font.SysFont("Helvetica", 32, True)
-    text_surface = font.render(text, True, p.Color("red"))
-    text_rect = text_surface.get_rect()
-    text_rect.center = (WIDTH // 2, HEIGHT // 2)
-    screen.blit(text_surface, text_rect)
+    while job['thread'].is_alive():
+        searcher.stop()  # Repeated in case the search had not started when first asked
+        job['thread'].join(0.05)
 #------------------------------
 def show_intro_screen(screen):
     """
@@ -194,41 +324,6 @@ def show_game_mode_screen(screen):
 #                 score += value if square[0] == 'w' else -value
 #     return score
 
-#------------------------------
-def minimax(gs, depth, alpha, beta, maximizing_player):
-    if depth == 0 or gs.checkMate or gs.staleMate:
-        return gs.evaluateBoard(), None
-
-    valid_moves = gs.getValidMoves()
-    best_move = None
-
-    if maximizing_player:
-        max_eval = float('-inf')
-        for move in valid_moves:
-            gs.makeMove(move)
-            eval, _ = minimax(gs, depth - 1, alpha, beta, False)
-            gs.undoMove()
-            if eval > max_eval:
-                max_eval = eval
-                best_move = move
-            alpha = max(alpha, eval)
-            if beta <= alpha:
-                break
-        return max_eval, best_move
-    else:
-        min_eval = float('inf')
-        for move in valid_moves:
-            gs.makeMove(move)
-            eval, _ = minimax(gs, depth - 1, alpha, beta, True)
-            gs.undoMove()
-            if eval < min_eval:
-                min_eval = eval
-                best_move = move
-            beta = min(beta, eval)
-            if beta <= alpha:
-                break
-        return min_eval, best_move
-
 #------------------------------
 def main():
     """
@@ -249,13 +344,21 @@ def main():
         return
     
     gs = GameState()
+    tablebase = Tablebase(TABLEBASE_DIR) if os.path.isdir(TABLEBASE_DIR) else None
+    if AI_WORKERS > 1:
+        searcher = ParallelSearcher(AI_WORKERS, TT_SIZE_MB)
+    else:
+        searcher = Searcher(TranspositionTable(TT_SIZE_MB), tablebase)
+    book = OpeningBook(BOOK_PATH) if os.path.exists(BOOK_PATH) else None
     loadImages()
+    renderer = BoardRenderer(screen)
     valid_moves = gs.getValidMoves()
     move_made = False
     animate = False
     game_over = False
     sq_selected = ()
     player_clicks = []
+    ai_job = None  # Background search in progress, if any
     
     running = True
     while running:
@@ -264,13 +367,19 @@ def main():
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
+            elif e.type == p.VIDEOEXPOSE:  # The window was uncovered: what was on it is gone
+                renderer.invalidate()
             elif e.type == p.KEYDOWN:
+                if e.key in (p.K_z, p.K_r) and ai_job:
+                    stopAISearch(searcher, ai_job)
+                    ai_job = None
                 if e.key == p.K_z:  # Undo
                     gs.undoMove()
                     move_made = True
                     game_over = False
                 if e.key == p.K_r:  # Reset
                     gs = GameState()
+                    searcher.tt.clear()
                     valid_moves = gs.getValidMoves()
                     sq_selected = ()
                     player_clicks = []
@@ -290,6 +399,9 @@ def main():
                 
                 if len(player_clicks) == 2:
                     move = Move(player_clicks[0], player_clicks[1], gs.board)
+                    if move.isPawnPromotion and move in valid_moves:  # Ask for the piece before the move is made
+                        piece = renderer.choosePromotion(move.pieceMoved[0], move.endCol, clock)
+                        move = Move(player_clicks[0], player_clicks[1], gs.board, promotionPiece=piece)
                     for valid_move in valid_moves:
                         if move == valid_move:
                             gs.makeMove(valid_move)
@@ -301,20 +413,31 @@ def main():
                     if not move_made:
                         player_clicks = [sq_selected]
         
-        # AI move logic would go here
-        if not game_over and not human_turn and game_mode == "ai":
-            _, ai_move = minimax(gs, 3, float('-inf'), float('inf'), False)
-            if ai_move:
-                gs.makeMove(ai_move)
+        # AI move: searched in the background, picked up once the thread is done
+        if not game_over and not human_turn and game_mode == "ai" and not move_made:
+            book_move = book.pickMove(gs) if book and ai_job is None else None
+            if book_move is not None:  # Known opening position: no search needed
+                gs.makeMove(Move.fromCode(book_move))
                 move_made = True
                 animate = True
                 sq_selected = ()
                 player_clicks = []
-
+            elif ai_job is None:
+                ai_job = startAISearch(searcher, gs)
+            elif ai_job['done']:
+                ai_move = ai_job['move']
+                # Only play it if the game is still at the position that was searched
+                if ai_move and ai_job['key'] == gs.zobristKey and ai_job['ply'] == len(gs.moveCodeLog):
+                    gs.makeMove(ai_move)
+                    move_made = True
+                    animate = True
+                    sq_selected = ()
+                    player_clicks = []
+                ai_job = None
         
         if move_made:
             if animate:
-                animateMove(gs.movelog[-1], screen, gs.board, clock)
+                renderer.animateMove(gs.movelog[-1], clock)
             valid_moves = gs.getValidMoves()
             move_made = False
             animate = False
@@ -322,18 +445,26 @@ def main():
             if gs.checkMate or gs.staleMate:
                 game_over = True
         
-        drawGameState(screen, gs, valid_moves, sq_selected)
-        
+        overlay = None
         if game_over:
             if gs.checkMate:
                 text = "Black wins by checkmate!" if gs.whiteToMove else "White wins by checkmate!"
             else:
                 text = "Game ended in stalemate"
-            drawEndGameText(screen, text)
-        
-        p.display.flip()
+            overlay = (drawEndGameText, text)
+        elif ai_job:
+            overlay = (drawThinkingText,)
+        renderer.render(gs, valid_moves, sq_selected, overlay)
         clock.tick(MAX_FPS)
     
+    if ai_job:
+        stopAISearch(searcher, ai_job)
+    if AI_WORKERS > 1:
+        searcher.close()
+    if book:
+        book.close()
+    if tablebase:
+        tablebase.close()
     p.quit()
 #---------------------------------------------------------------------------------------
 if __name__ == "__main__":
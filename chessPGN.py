@@ -0,0 +1,258 @@
+"""
+Streaming PGN reader: games are read one at a time from files of any size, SAN
+moves are resolved against the legal moves and replayed with makeMove.
+
+Usage:
+    python chessPGN.py games.pgn more.pgn.gz --workers 4    replay every game, print throughput
+    python chessPGN.py games.pgn --fens                     print the FEN of every position
+"""
+import argparse
+import bz2
+import gzip
+import multiprocessing
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from chessEngine import GameState, PIECE_NAMES, FLAG_CASTLE, PROMOTION_FLAGS
+
+TAG_RE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Movetext tokens: comments, variation brackets, NAGs, move numbers and everything else (SAN, results)
+TOKEN_RE = re.compile(r'\{[^}]*\}?|;[^\n]*|[()]|\$\d+|\d+\.+|[^\s(){};$]+')
+SAN_RE = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?-?([a-h][1-8])(?:=?([NBRQnbrq]))?$')
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+#------------------------------------------------------------------------------------------------
+class PGNGame():
+    """
+    One game from a PGN file: its tag pairs, main line moves in SAN and result
+    """
+    def __init__(self, headers, moves, result):
+        self.headers = headers
+        self.moves = moves
+        self.result = result
+    #------------------------------
+    def getStartFen(self):
+        """
+        FEN of the starting position: the FEN tag when there is one, else None
+        """
+        return self.headers.get("FEN")
+
+#------------------------------------------------------------------------------------------------
+def openPgn(path):
+    """
+    Open a PGN file for reading as text; .gz and .bz2 files are decompressed on the fly
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8", errors="replace")
+    return open(path, encoding="utf-8", errors="replace")
+#------------------------------
+def parseMovetext(text):
+    """
+    Main line SAN moves and the result of a game's movetext; comments, NAGs,
+    move numbers and variations (nested to any depth) are skipped
+    """
+    moves = []
+    result = "*"
+    depth = 0  # Variation nesting
+    for token in TOKEN_RE.findall(text):
+        first = token[0]
+        if first == '(':
+            depth += 1
+        elif first == ')':
+            depth = max(depth - 1, 0)
+        elif depth or first in "{;$" or (first.isdigit() and token[-1] == '.'):
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return moves, result
+#------------------------------
+def commentOpenAfter(line, inComment):
+    """
+    Whether a {comment} is still open at the end of a movetext line, given whether
+    one was open at its start (a ; comment ends with its line)
+    """
+    if not inComment and '{' not in line:
+        return False
+    if inComment and '}' not in line:
+        return True
+    for ch in line:
+        if inComment:
+            if ch == '}':
+                inComment = False
+        elif ch == '{':
+            inComment = True
+        elif ch == ';':
+            break
+    return inComment
+#------------------------------
+def readGames(source):
+    """
+    Yield a PGNGame for every game in source: a file path, an open text file or any
+    iterable of lines. Only one game is held in memory at a time. A tag line starts
+    a new game when it follows movetext or a blank line; lines inside a {comment},
+    even ones starting with '[', are movetext.
+    """
+    if isinstance(source, str):
+        with openPgn(source) as f:
+            yield from readGames(f)
+        return
+    headers = {}
+    movetext = []
+    in_comment = False  # A {comment} runs on from an earlier line
+    blank = False  # A blank line came after the last tag
+    for line in source:
+        if not in_comment and line.startswith('%'):  # Escape mechanism: the line is ignored
+            continue
+        stripped = line.strip()
+        if not in_comment and stripped.startswith('['):
+            if movetext or (headers and blank):  # The next game's tags
+                moves, result = parseMovetext("\n".join(movetext))
+                yield PGNGame(headers, moves, result)
+                headers, movetext = {}, []
+            blank = False
+            match = TAG_RE.match(stripped)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+        elif stripped:
+            movetext.append(stripped)
+            in_comment = commentOpenAfter(stripped, in_comment)
+        else:
+            blank = True
+    if headers or movetext:
+        moves, result = parseMovetext("\n".join(movetext))
+        yield PGNGame(headers, moves, result)
+#------------------------------
+def parseSan(gs, san, moves=None):
+    """
+    The packed legal move (see GameState.getLegalMoves) that the SAN string san
+    stands for in the current position. Handles disambiguation, captures, castling,
+    promotion and check/annotation suffixes. Raises ValueError for an illegal,
+    ambiguous or unreadable move.
+    """
+    if moves is None:
+        moves = gs.getLegalMoves()[0]
+    text = san.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        kingside = len(text) == 3
+        for code in moves:
+            if (code >> 12) & 7 == FLAG_CASTLE and (((code >> 6) & 7) == 6) == kingside:
+                return code
+        raise ValueError("Illegal castling %s in %s" % (san, gs.getFen()))
+
+    match = SAN_RE.match(text)
+    if not match:
+        raise ValueError("Can't read move '%s'" % san)
+    piece, from_file, from_rank, target, promotion = match.groups()
+    piece = piece or 'p'
+    end = (8 - int(target[1])) * 8 + ord(target[0]) - ord('a')
+    found = None
+    for code in moves:
+        if (code >> 6) & 63 != end or PIECE_NAMES[(code >> 16) & 15][1] != piece:
+            continue
+        start = code & 63
+        if from_file and start & 7 != ord(from_file) - ord('a'):
+            continue
+        if from_rank and start >> 3 != 8 - int(from_rank):
+            continue
+        flag = (code >> 12) & 7
+        if promotion:
+            if flag != PROMOTION_FLAGS[promotion.upper()]:
+                continue
+        elif flag & 4:  # A promotion needs its piece
+            continue
+        if found is not None:
+            raise ValueError("Ambiguous move %s in %s" % (san, gs.getFen()))
+        found = code
+    if found is None:
+        raise ValueError("Illegal move %s in %s" % (san, gs.getFen()))
+    return found
+#------------------------------
+def replayGame(game):
+    """
+    Play a PGNGame through makeMove, yielding (gs, code) before every move: the
+    position and the packed move about to be played in it. gs is one GameState
+    that changes as the game goes on, so read what you need before the next step.
+    Raises ValueError at the first move that can't be played.
+    """
+    gs = GameState(game.getStartFen())
+    for san in game.moves:
+        code = parseSan(gs, san)
+        yield gs, code
+        gs.makeMoveCode(code)
+#------------------------------
+def readPositions(source, errors=None):
+    """
+    Yield (gs, code) for every move of every game in source (see readGames and
+    replayGame). A game with a bad FEN or move is dropped from that point on; pass
+    a list as errors to collect (game number, message) for each of them.
+    """
+    for number, game in enumerate(readGames(source)):
+        try:
+            yield from replayGame(game)
+        except ValueError as e:
+            if errors is not None:
+                errors.append((number, str(e)))
+#------------------------------
+def replayFile(path):
+    """
+    Worker task: replay every game of one file.
+    Returns (path, games, positions, bad games, seconds).
+    """
+    start = time.perf_counter()
+    games = positions = bad = 0
+    for game in readGames(path):
+        games += 1
+        try:
+            for _ in replayGame(game):
+                positions += 1
+        except ValueError:
+            bad += 1
+    return path, games, positions, bad, time.perf_counter() - start
+#------------------------------
+def mapFiles(function, paths, workers=None):
+    """
+    Run function(path) for every file across worker processes (default one per CPU)
+    and yield the results as they finish. function must be a module-level function.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield function(path)
+        return
+    with ProcessPoolExecutor(min(workers, len(paths))) as pool:
+        for future in as_completed([pool.submit(function, path) for path in paths]):
+            yield future.result()
+#------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Read and replay PGN files")
+    parser.add_argument("files", nargs='+', help="PGN files (.pgn, .pgn.gz or .pgn.bz2)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(),
+                        help="worker processes, each replaying whole files")
+    parser.add_argument("--fens", action="store_true", help="print the FEN of every position instead")
+    args = parser.parse_args(argv)
+
+    if args.fens:
+        for path in args.files:
+            for gs, _ in readPositions(path):
+                print(gs.getFen())
+        return 0
+
+    start = time.perf_counter()
+    total_games = total_positions = total_bad = 0
+    for path, games, positions, bad, elapsed in mapFiles(replayFile, args.files, args.workers):
+        total_games += games
+        total_positions += positions
+        total_bad += bad
+        print("%s: %d games (%d bad), %d positions in %.2fs" % (path, games, bad, positions, elapsed), file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print("total: %d games (%d bad), %d positions in %.2fs (%d positions per second)" % (
+        total_games, total_bad, total_positions, elapsed, total_positions / max(elapsed, 1e-9)), file=sys.stderr)
+    return 0
+#---------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Perft: count the leaf nodes of the legal move tree to a fixed depth.
+The counts check the move generator (castling, en passant and promotion included)
+against known values, and the run time gives one throughput number for the
+getValidMoves/makeMove/undoMove loop.
+
+Usage:
+    python chessPerft.py                       run the reference suite
+    python chessPerft.py --fen "<FEN>" --depth 4 --divide
+"""
+import argparse
+import sys
+import time
+
+from chessEngine import GameState, Move
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+# (name, FEN, node counts for depth 1, 2, ...), see https://www.chessprogramming.org/Perft_Results
+REFERENCE_POSITIONS = [
+    ("start", START_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+#------------------------------
+def perft(gs, depth):
+    """
+    Number of leaf nodes depth plies below the current position
+    """
+    moves = gs.getLegalMoves()[0]
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for code in moves:
+        gs.makeMoveCode(code)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+#------------------------------
+def divide(gs, depth):
+    """
+    Perft split by root move: list of (move notation, leaf nodes)
+    """
+    results = []
+    for code in gs.getLegalMoves()[0]:
+        gs.makeMoveCode(code)
+        results.append((Move.fromCode(code).getChessNotation(), perft(gs, depth - 1)))
+        gs.undoMove()
+    return results
+#------------------------------
+def runPerft(fen, depth, show_divide=False, out=sys.stdout):
+    """
+    Run perft on one position and print the node count and nodes per second.
+    Returns (nodes, seconds).
+    """
+    gs = GameState(fen)
+    start = time.perf_counter()
+    if show_divide:
+        results = divide(gs, depth)
+        nodes = sum(count for _, count in results)
+        for notation, count in sorted(results):
+            print("%s: %d" % (notation, count), file=out)
+    else:
+        nodes = perft(gs, depth)
+    elapsed = time.perf_counter() - start
+    print("depth %d: %d nodes in %.2fs (%d nps)" % (depth, nodes, elapsed, nodes / max(elapsed, 1e-9)), file=out)
+    return nodes, elapsed
+#------------------------------
+def runSuite(max_depth=3, max_nodes=200000, out=sys.stdout):
+    """
+    Check every reference position at increasing depth, skipping depths whose
+    known count exceeds max_nodes. Returns True when every count matches.
+    """
+    passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, counts in REFERENCE_POSITIONS:
+        gs = GameState(fen)
+        for depth, expected in enumerate(counts[:max_depth], start=1):
+            if expected > max_nodes:
+                break
+            start = time.perf_counter()
+            nodes = perft(gs, depth)
+            elapsed = time.perf_counter() - start
+            total_nodes += nodes
+            total_time += elapsed
+            ok = nodes == expected
+            passed = passed and ok
+            print("%-10s depth %d: %9d %s (%d nps)" % (
+                name, depth, nodes, "ok" if ok else "FAIL, expected %d" % expected,
+                nodes / max(elapsed, 1e-9)), file=out)
+    print("total: %d nodes in %.2fs (%d nps)" % (total_nodes, total_time, total_nodes / max(total_time, 1e-9)), file=out)
+    return passed
+#------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perft move generator benchmark and validation")
+    parser.add_argument("--fen", help="position to search (default: run the reference suite)")
+    parser.add_argument("--depth", type=int, default=3, help="search depth (suite: maximum depth)")
+    parser.add_argument("--divide", action="store_true", help="print the node count under each root move")
+    parser.add_argument("--max-nodes", type=int, default=200000,
+                        help="suite only: skip depths with more reference nodes than this")
+    args = parser.parse_args(argv)
+    if args.fen:
+        runPerft(args.fen, args.depth, args.divide)
+        return 0
+    return 0 if runSuite(args.depth, args.max_nodes) else 1
+#---------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
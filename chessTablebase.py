@@ -0,0 +1,474 @@
+"""
+Endgame tablebases for positions with up to 4 pieces (kings included): every
+position of a material set (KQvK, KRvK, KPvK, KBNvK, KQvKR...) is solved by
+retrograde analysis and stored as one byte holding win/draw/loss and the distance
+to mate in plies, in a file the probing code memory-maps.
+
+Tables only cover positions without castling rights or an en passant square, so
+material with pawns on both sides (KPvKP), where en passant captures can decide the
+game, isn't supported. The stronger side is always stored as white; positions where
+black has it are probed with the colours swapped and the board mirrored.
+
+Usage:
+    python chessTablebase.py KQvK KRvK KPvK --dir tablebases
+"""
+import argparse
+import mmap
+import os
+import sys
+import time
+
+from chessEngine import (KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS, rookAttacks, bishopAttacks,
+                         PIECE_NAMES, NO_SQUARE)
+
+PIECE_ORDER = "KQRBNP"
+PIECE_STRENGTH = {'K': 0, 'Q': 9, 'R': 5, 'B': 3, 'N': 3, 'P': 1}
+PROMOTION_TYPES = "QRBN"
+MAX_PIECES = 4
+# Byte values: 0 = draw (or an impossible position), 1-127 = the side to move mates in
+# that many plies, 128 + n = the side to move is mated in n plies (128 = checkmated now)
+DRAW = 0
+LOSS = 128
+#------------------------------
+def encodeValue(plies):
+    """
+    Byte for a decided position: odd plies are wins for the side to move, even plies losses
+    """
+    if plies > 127:
+        raise ValueError("Distance to mate of %d plies doesn't fit in a byte" % plies)
+    return plies if plies % 2 else LOSS + plies
+#------------------------------
+def decodeValue(value):
+    """
+    (result, plies) for a table byte: result is 1 (side to move wins), 0 or -1
+    """
+    if value == DRAW:
+        return 0, 0
+    if value < LOSS:
+        return 1, value
+    return -1, value - LOSS
+#------------------------------
+def sortPieces(types):
+    """
+    Piece letters in table order (K Q R B N P)
+    """
+    return "".join(sorted(types, key=PIECE_ORDER.index))
+#------------------------------
+def canonicalMaterial(white, black):
+    """
+    (table name, colours swapped) for the given white and black piece letters:
+    the side with more material is always white in the tables
+    """
+    white, black = sortPieces(white), sortPieces(black)
+    if (sum(PIECE_STRENGTH[t] for t in black), len(black), black) > \
+            (sum(PIECE_STRENGTH[t] for t in white), len(white), white):
+        return black + "v" + white, True
+    return white + "v" + black, False
+#------------------------------
+def isTrivialDraw(white, black):
+    """
+    True when no checkmate is possible at all: bare kings, or king and one minor piece against a bare king
+    """
+    white, black = sortPieces(white), sortPieces(black)
+    return (white == "K" and black in ("K", "KB", "KN")) or (black == "K" and white in ("KB", "KN"))
+#------------------------------
+def hasEnpassant(white, black):
+    """
+    True when both sides have pawns, so en passant captures can happen. The tables
+    have no en passant right in their positions, so such material can't be solved.
+    """
+    return 'P' in white and 'P' in black
+#------------------------------
+def lookupValue(tables, pieces, stm):
+    """
+    Table byte for a position given as [(colour, piece letter, square)] with stm
+    (0 white, 1 black) to move. tables maps names to their bytes; None when the
+    table isn't there.
+    """
+    white = [t for color, t, _ in pieces if color == 'w']
+    black = [t for color, t, _ in pieces if color == 'b']
+    if isTrivialDraw(white, black):
+        return DRAW
+    name, swapped = canonicalMaterial(white, black)
+    data = tables.get(name)
+    if data is None:
+        return None
+    if swapped:
+        pieces = [('b' if color == 'w' else 'w', t, sq ^ 56) for color, t, sq in pieces]
+        stm ^= 1
+    pieces = sorted(pieces, key=lambda piece: (piece[0] == 'b', PIECE_ORDER.index(piece[1])))
+    index = stm
+    for _, _, sq in pieces:
+        index = index << 6 | sq
+    return data[index]
+
+#------------------------------------------------------------------------------------------------
+class MaterialTable():
+    """
+    Move rules for one material set, on positions given as (side to move, one square
+    per piece in table order: white pieces then black, each in K Q R B N P order).
+    Index = side to move, then each square, 6 bits apiece.
+    """
+    def __init__(self, name):
+        white, black = name.split('v')
+        self.name = name
+        self.types = list(white + black)
+        self.colors = ['w'] * len(white) + ['b'] * len(black)
+        self.count = len(self.types)
+        self.size = 2 << (6 * self.count)
+        self.kings = {'w': 0, 'b': len(white)}  # Index of each king in the piece list
+    #------------------------------
+    def decode(self, index):
+        """
+        (side to move, squares) of an index
+        """
+        squares = [0] * self.count
+        for i in range(self.count - 1, -1, -1):
+            squares[i] = index & 63
+            index >>= 6
+        return index, squares
+    #------------------------------
+    def encode(self, stm, squares):
+        """
+        Index of a position
+        """
+        index = stm
+        for sq in squares:
+            index = index << 6 | sq
+        return index
+    #------------------------------
+    def attacks(self, i, sq, occupied):
+        """
+        Squares piece i would attack from sq
+        """
+        t = self.types[i]
+        if t == 'K':
+            return KING_ATTACKS[sq]
+        if t == 'N':
+            return KNIGHT_ATTACKS[sq]
+        if t == 'P':
+            return PAWN_ATTACKS[self.colors[i]][sq]
+        attacks = 0
+        if t in "RQ":
+            attacks |= rookAttacks(sq, occupied)
+        if t in "BQ":
+            attacks |= bishopAttacks(sq, occupied)
+        return attacks
+    #------------------------------
+    def isAttacked(self, sq, color, squares, occupied, captured=-1):
+        """
+        Is sq attacked by a piece of the given colour (other than the captured one)
+        """
+        bit = 1 << sq
+        for i in range(self.count):
+            if self.colors[i] == color and i != captured and self.attacks(i, squares[i], occupied) & bit:
+                return True
+        return False
+    #------------------------------
+    def isValid(self, stm, squares):
+        """
+        Pieces on distinct squares, no pawn on the first or last rank, and the side
+        not to move not in check
+        """
+        if len(set(squares)) != self.count:
+            return False
+        for i in range(self.count):
+            if self.types[i] == 'P' and squares[i] >> 3 in (0, 7):
+                return False
+        occupied = 0
+        for sq in squares:
+            occupied |= 1 << sq
+        them = 'b' if stm == 0 else 'w'
+        return not self.isAttacked(squares[self.kings[them]], 'w' if stm == 0 else 'b', squares, occupied)
+    #------------------------------
+    def inCheck(self, stm, squares):
+        """
+        Is the side to move in check
+        """
+        occupied = 0
+        for sq in squares:
+            occupied |= 1 << sq
+        us, them = ('w', 'b') if stm == 0 else ('b', 'w')
+        return self.isAttacked(squares[self.kings[us]], them, squares, occupied)
+    #------------------------------
+    def successors(self, stm, squares, tables):
+        """
+        Yield (successor index, None) for every legal move that stays in this table and
+        (None, table byte of the resulting position) for captures and promotions
+        """
+        us, them = ('w', 'b') if stm == 0 else ('b', 'w')
+        occupied = own = 0
+        for i, sq in enumerate(squares):
+            occupied |= 1 << sq
+            if self.colors[i] == us:
+                own |= 1 << sq
+        for i in range(self.count):
+            if self.colors[i] != us:
+                continue
+            sq = squares[i]
+            if self.types[i] == 'P':
+                step = -8 if us == 'w' else 8
+                targets = PAWN_ATTACKS[us][sq] & occupied & ~own
+                if not occupied >> (sq + step) & 1:
+                    targets |= 1 << (sq + step)
+                    if sq >> 3 == (6 if us == 'w' else 1) and not occupied >> (sq + 2 * step) & 1:
+                        targets |= 1 << (sq + 2 * step)
+            else:
+                targets = self.attacks(i, sq, occupied) & ~own
+            while targets:
+                lsb = targets & -targets
+                targets ^= lsb
+                end = lsb.bit_length() - 1
+                captured = squares.index(end) if occupied & lsb else -1
+                moved = squares[:]
+                moved[i] = end
+                king = moved[self.kings[us]]
+                if self.isAttacked(king, them, moved, occupied ^ (1 << sq) | lsb, captured):
+                    continue
+                promotion = self.types[i] == 'P' and end >> 3 in (0, 7)
+                if captured < 0 and not promotion:
+                    yield self.encode(stm ^ 1, moved), None
+                    continue
+                for new_type in (PROMOTION_TYPES if promotion else self.types[i]):
+                    pieces = [(self.colors[j], new_type if j == i else self.types[j], moved[j])
+                              for j in range(self.count) if j != captured]
+                    yield None, lookupValue(tables, pieces, stm ^ 1)
+    #------------------------------
+    def predecessors(self, stm, squares):
+        """
+        Indices of the positions one quiet, non-capturing move before this one
+        (a move by the side not to move here that stays in this table)
+        """
+        mover = 'b' if stm == 0 else 'w'
+        occupied = 0
+        for sq in squares:
+            occupied |= 1 << sq
+        for i in range(self.count):
+            if self.colors[i] != mover:
+                continue
+            sq = squares[i]
+            if self.types[i] == 'P':
+                back = 8 if mover == 'w' else -8  # Pawns only move forwards, so step back
+                sources = 0
+                start = sq + back
+                if 8 <= start < 56 and not occupied >> start & 1:
+                    sources |= 1 << start
+                    if sq >> 3 == (4 if mover == 'w' else 3) and not occupied >> (start + back) & 1:
+                        sources |= 1 << (start + back)
+            else:
+                sources = self.attacks(i, sq, occupied) & ~occupied
+            while sources:
+                lsb = sources & -sources
+                sources ^= lsb
+                moved = squares[:]
+                moved[i] = lsb.bit_length() - 1
+                if self.isValid(stm ^ 1, moved):
+                    yield self.encode(stm ^ 1, moved)
+
+#------------------------------------------------------------------------------------------------
+def dependencies(name):
+    """
+    Tables reached from this one by a capture or promotion (trivial draws left out)
+    """
+    white, black = name.split('v')
+    reached = set()
+    for side, other, white_side in ((white, black, True), (black, white, False)):
+        for k, t in enumerate(side):
+            changes = [side[:k] + side[k + 1:]] if t != 'K' else []  # Captured
+            if t == 'P':
+                changes += [side[:k] + promoted + side[k + 1:] for promoted in PROMOTION_TYPES]
+            for changed in changes:
+                new_white, new_black = (changed, other) if white_side else (other, changed)
+                if not isTrivialDraw(new_white, new_black):
+                    reached.add(canonicalMaterial(new_white, new_black)[0])
+    reached.discard(name)
+    return sorted(reached)
+#------------------------------
+def generateTable(name, tables):
+    """
+    Solve every position of a material set by retrograde analysis. The tables it
+    can reach by captures and promotions must already be in tables.
+    Returns the table as a bytearray.
+    """
+    if hasEnpassant(*name.split('v')):
+        raise ValueError("%s: en passant isn't modelled, so tables with pawns on both sides can't be built" % name)
+    table = MaterialTable(name)
+    values = bytearray(table.size)
+    counts = bytearray(table.size)  # Quiet moves whose result isn't known to lose yet
+    can_hold = bytearray(table.size)  # 1 when a capture or promotion already draws or wins
+    slowest_exit = {}  # Longest loss through a capture or promotion, in plies
+    levels = {}  # Plies -> positions decided at that distance to mate
+
+    def schedule(plies, index):
+        levels.setdefault(plies, []).append(index)
+
+    # Count the moves of every position; mates and conversions give the first results
+    for index in range(table.size):
+        stm, squares = table.decode(index)
+        if not table.isValid(stm, squares):
+            continue
+        count = 0
+        moves = False
+        win = slowest = None
+        for successor, value in table.successors(stm, squares, tables):
+            moves = True
+            if successor is not None:
+                count += 1
+                continue
+            result, plies = decodeValue(value)
+            if result < 0:
+                win = plies + 1 if win is None else min(win, plies + 1)
+            elif result > 0:
+                slowest = plies + 1 if slowest is None else max(slowest, plies + 1)
+            else:
+                can_hold[index] = 1
+        if not moves:
+            if table.inCheck(stm, squares):
+                schedule(0, index)  # Checkmated; stalemate stays a draw
+            continue
+        counts[index] = count
+        if win is not None:
+            can_hold[index] = 1
+            schedule(win, index)
+        elif slowest is not None:
+            slowest_exit[index] = slowest
+            if count == 0 and not can_hold[index]:
+                schedule(slowest, index)  # Every move loses
+
+    # Work outwards from the mates, one ply at a time
+    plies = 0
+    while levels:
+        for index in levels.pop(plies, []):
+            if values[index]:
+                continue
+            values[index] = encodeValue(plies)
+            stm, squares = table.decode(index)
+            for predecessor in table.predecessors(stm, squares):
+                if values[predecessor]:
+                    continue
+                if plies % 2 == 0:  # Lost here, so the move into it wins
+                    schedule(plies + 1, predecessor)
+                else:
+                    counts[predecessor] -= 1
+                    if counts[predecessor] == 0 and not can_hold[predecessor]:
+                        schedule(max(plies + 1, slowest_exit.get(predecessor, 0)), predecessor)
+        plies += 1
+    return values
+#------------------------------
+def ensureTable(name, directory, tables, out=sys.stdout):
+    """
+    Load a table from directory, generating it (and whatever it depends on) first
+    if the file isn't there
+    """
+    if name in tables:
+        return
+    path = os.path.join(directory, name + ".tb")
+    if not os.path.exists(path):
+        for dependency in dependencies(name):
+            ensureTable(dependency, directory, tables, out)
+        start = time.perf_counter()
+        values = generateTable(name, tables)
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(values)
+        print("%s: %d positions in %.1fs" % (name, len(values), time.perf_counter() - start), file=out)
+    with open(path, "rb") as f:
+        tables[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+#------------------------------------------------------------------------------------------------
+class Tablebase():
+    """
+    Probe the table files in a directory (made by ensureTable). Files are memory-mapped
+    the first time their material comes up; a missing file just means no result.
+    """
+    def __init__(self, directory="tablebases"):
+        self.directory = directory
+        self.tables = {}
+        self.missing = set()
+        self.maxPieces = MAX_PIECES
+    #------------------------------
+    def close(self):
+        """
+        Unmap every open table
+        """
+        for data in self.tables.values():
+            data.close()
+        self.tables = {}
+    #------------------------------
+    def loadTable(self, name):
+        """
+        Map a table file if it exists and hasn't been mapped yet
+        """
+        if name in self.tables or name in self.missing:
+            return
+        path = os.path.join(self.directory, name + ".tb")
+        if not os.path.exists(path):
+            self.missing.add(name)
+            return
+        with open(path, "rb") as f:
+            self.tables[name] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    #------------------------------
+    def probe(self, gs):
+        """
+        (result, plies) for the side to move: result 1 win, 0 draw, -1 loss, and the
+        distance to mate in plies. None when the position isn't covered.
+        """
+        occupied = gs.colorBitboards['w'] | gs.colorBitboards['b']
+        if occupied.bit_count() > self.maxPieces or gs.enpassantSquare != NO_SQUARE or gs.castling:
+            return None
+        pieces = []
+        codes = gs.pieceCodes
+        while occupied:
+            lsb = occupied & -occupied
+            occupied ^= lsb
+            sq = lsb.bit_length() - 1
+            piece = PIECE_NAMES[codes[sq]]
+            pieces.append((piece[0], piece[1].upper(), sq))
+        white = [t for color, t, _ in pieces if color == 'w']
+        black = [t for color, t, _ in pieces if color == 'b']
+        if hasEnpassant(white, black):
+            return None
+        if not isTrivialDraw(white, black):
+            self.loadTable(canonicalMaterial(white, black)[0])
+        value = lookupValue(self.tables, pieces, 0 if gs.whiteToMove else 1)
+        return decodeValue(value) if value is not None else None
+    #------------------------------
+    def bestMove(self, gs, moves):
+        """
+        The move (from the packed legal moves given) that keeps the best result: the
+        fastest win, else a draw, else the slowest loss. None unless every move's
+        result is in the tables.
+        """
+        best_move, best_key = None, None
+        for code in moves:
+            gs.makeMoveCode(code)
+            probed = self.probe(gs)
+            gs.undoMove()
+            if probed is None:
+                return None
+            result, plies = probed
+            key = (-result, -plies if result < 0 else plies)  # Our result: quick wins, slow losses
+            if best_key is None or key > best_key:
+                best_move, best_key = code, key
+        return best_move
+#------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases by retrograde analysis")
+    parser.add_argument("tables", nargs='+', help="material sets such as KQvK, KRvK, KPvK, KBNvK, KQvKR")
+    parser.add_argument("--dir", default="tablebases", help="directory for the table files")
+    args = parser.parse_args(argv)
+    tables = {}
+    for name in args.tables:
+        white, black = name.upper().split('V')
+        if len(white + black) > MAX_PIECES or white.count('K') != 1 or black.count('K') != 1:
+            parser.error("%s: need one king per side and at most %d pieces" % (name, MAX_PIECES))
+        if hasEnpassant(white, black):
+            parser.error("%s: pawns on both sides (en passant) aren't supported" % name)
+        if isTrivialDraw(white, black):
+            print("%s: always a draw, no table needed" % name)
+            continue
+        ensureTable(canonicalMaterial(white, black)[0], args.dir, tables)
+    return 0
+#---------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,353 @@
+"""
+UCI front end, so the engine can be run by any UCI GUI or match runner (cutechess,
+Arena...) or on a server without a display. It only needs chessEngine and chessAI:
+no pygame and no window.
+
+Commands are read by an asyncio loop while the search runs in a thread, so stop and
+isready are answered straight away during a search.
+
+Usage:
+    python chessUCI.py
+    python chessUCI.py --startup    time from start to uciok, in milliseconds
+"""
+import asyncio
+import os
+import sys
+import time
+
+START_TIME = time.perf_counter()
+
+from chessEngine import GameState, PROMOTION_FLAGS
+from chessAI import Searcher, TranspositionTable, CHECKMATE, TABLEBASE_WIN, MATE_SCORE, WON_SCORE
+
+ENGINE_NAME = "Chess"
+ENGINE_AUTHOR = "Farouk12385"
+DEFAULT_HASH_MB = 16
+MOVE_OVERHEAD = 0.05  # Seconds kept back from every move for the GUI and the pipes
+DEFAULT_MOVES_TO_GO = 30  # Moves the remaining clock time is shared between when the GUI doesn't say
+#------------------------------
+def moveToUci(code):
+    """
+    Long algebraic notation of a packed move (e2e4, e7e8q, castling as e1g1)
+    """
+    start = code & 63
+    end = (code >> 6) & 63
+    text = "abcdefgh"[start & 7] + str(8 - (start >> 3)) + "abcdefgh"[end & 7] + str(8 - (end >> 3))
+    flag = (code >> 12) & 7
+    if flag > 3:
+        text += "nbrq"[flag - 4]
+    return text
+#------------------------------
+def parseUciMove(gs, text):
+    """
+    The packed legal move for a long algebraic move in the current position.
+    Raises ValueError when it isn't legal.
+    """
+    text = text.strip().lower()
+    if len(text) not in (4, 5) or text[0] not in "abcdefgh" or text[2] not in "abcdefgh" or \
+            text[1] not in "12345678" or text[3] not in "12345678":
+        raise ValueError("Can't read move '%s'" % text)
+    start = (8 - int(text[1])) * 8 + ord(text[0]) - ord('a')
+    end = (8 - int(text[3])) * 8 + ord(text[2]) - ord('a')
+    flag = PROMOTION_FLAGS.get(text[4].upper()) if len(text) == 5 else None
+    for code in gs.getLegalMoves()[0]:
+        if code & 63 == start and (code >> 6) & 63 == end:
+            code_flag = (code >> 12) & 7
+            if flag is None and code_flag < 4 or code_flag == flag:
+                return code
+    raise ValueError("Illegal move %s in %s" % (text, gs.getFen()))
+#------------------------------
+def formatScore(score, whiteToMove):
+    """
+    UCI score of a search score (white's point of view): centipawns or mate in moves,
+    both from the side to move's point of view
+    """
+    if not whiteToMove:
+        score = -score
+    if abs(score) > WON_SCORE:  # CHECKMATE or TABLEBASE_WIN less the plies to mate
+        plies = (CHECKMATE if abs(score) > MATE_SCORE else TABLEBASE_WIN) - abs(score)
+        return "mate %d" % ((plies + 1) // 2 if score > 0 else -((plies + 1) // 2))
+    return "cp %d" % score
+#------------------------------
+def thinkingTime(whiteToMove, limits):
+    """
+    Seconds to search for a go command's limits: movetime as given, otherwise an even
+    share of the side's clock plus most of its increment. None for no time limit.
+    """
+    if 'movetime' in limits:
+        return max(limits['movetime'] / 1000 - MOVE_OVERHEAD, 0.01)
+    clock = limits.get('wtime' if whiteToMove else 'btime')
+    if clock is None:
+        return None
+    clock /= 1000
+    increment = limits.get('winc' if whiteToMove else 'binc', 0) / 1000
+    moves_to_go = limits.get('movestogo', DEFAULT_MOVES_TO_GO)
+    budget = clock / max(moves_to_go, 1) + increment * 0.8
+    return max(min(budget, clock / 2 - MOVE_OVERHEAD), 0.01)
+
+#------------------------------------------------------------------------------------------------
+class UCIEngine():
+    """
+    State of one UCI session: the current position, the searcher and the running
+    search. handle() runs one command; run() reads commands until quit.
+    """
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.gs = GameState()
+        self.hashMB = DEFAULT_HASH_MB
+        self.tt = TranspositionTable(self.hashMB)
+        self.tablebase = None
+        self.book = None
+        self.statsLog = None
+        self.searcher = Searcher(self.tt)
+        self.search = None  # asyncio task of the running search
+        self.infinite = False  # go infinite or ponder: hold bestmove back until stop
+        self.limits = {}  # Limits of the last go command
+        self.stopEvent = None
+        self.loop = None
+    #------------------------------
+    def send(self, line):
+        """
+        Write one line to the GUI
+        """
+        self.out.write(line + "\n")
+        self.out.flush()
+    #------------------------------
+    async def run(self, lines=None):
+        """
+        Answer commands until quit or end of input. lines is an async iterator of
+        lines; by default stdin is read in a helper thread.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.stopEvent = asyncio.Event()
+        if lines is None:
+            lines = self.readStdin()
+        async for line in lines:
+            if not await self.handle(line):
+                break
+        await self.stopSearch()
+        self.closeFiles()
+    #------------------------------
+    async def readStdin(self):
+        """
+        Lines of stdin, read in a thread so the loop keeps running between them
+        """
+        while True:
+            line = await self.loop.run_in_executor(None, sys.stdin.readline)
+            if not line:
+                return
+            yield line
+    #------------------------------
+    async def handle(self, line):
+        """
+        Run one command. Returns False for quit.
+        """
+        words = line.split()
+        if not words:
+            return True
+        command, args = words[0], words[1:]
+        if command == "uci":
+            self.send("id name %s" % ENGINE_NAME)
+            self.send("id author %s" % ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max 4096" % DEFAULT_HASH_MB)
+            self.send("option name Clear Hash type button")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name TablebasePath type string default <empty>")
+            self.send("option name StatsLog type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")  # Searches run in a thread, so this is never held up
+        elif command == "setoption":
+            await self.stopSearch()
+            self.setOption(args)
+        elif command == "ucinewgame":
+            await self.stopSearch()
+            self.tt.clear()
+            self.gs = GameState()
+        elif command == "position":
+            await self.stopSearch()
+            self.setPosition(args)
+        elif command == "go":
+            await self.stopSearch()
+            self.startSearch(args)
+        elif command == "stop":
+            await self.stopSearch()
+        elif command == "ponderhit":
+            self.ponderHit()
+        elif command == "quit":
+            return False
+        elif command != "debug":
+            self.send("info string unknown command %s" % command)
+        return True
+    #------------------------------
+    def setOption(self, args):
+        """
+        setoption name <name> [value <value>]; names may contain spaces
+        """
+        if "name" not in args:
+            return
+        value_at = args.index("value") if "value" in args else len(args)
+        name = " ".join(args[args.index("name") + 1:value_at]).lower()
+        value = " ".join(args[value_at + 1:])
+        if value == "<empty>":
+            value = ""
+        if name == "hash":
+            try:
+                self.hashMB = max(1, int(value))
+            except ValueError:
+                self.send("info string bad Hash value %s" % value)
+                return
+            self.tt = TranspositionTable(self.hashMB)
+            self.searcher.tt = self.tt
+        elif name == "clear hash":
+            self.tt.clear()
+        elif name == "bookfile":
+            if self.book:
+                self.book.close()
+            self.book = None
+            if value:
+                from chessBook import OpeningBook  # Only loaded when asked for
+                try:
+                    self.book = OpeningBook(value)
+                except OSError as e:
+                    self.send("info string can't open book: %s" % e)
+        elif name == "tablebasepath":
+            if self.tablebase:
+                self.tablebase.close()
+            self.tablebase = None
+            if value:
+                from chessTablebase import Tablebase
+                self.tablebase = Tablebase(value)
+            self.searcher.tablebase = self.tablebase
+        elif name == "statslog":
+            if self.statsLog:
+                self.statsLog.close()
+            self.statsLog = None
+            if value:
+                try:
+                    self.statsLog = open(value, "a")
+                except OSError as e:
+                    self.send("info string can't open stats log: %s" % e)
+            self.searcher.statsLog = self.statsLog
+        else:
+            self.send("info string unknown option %s" % name)
+    #------------------------------
+    def setPosition(self, args):
+        """
+        position startpos|fen <FEN> [moves <move>...]
+        """
+        moves_at = args.index("moves") if "moves" in args else len(args)
+        try:
+            if args and args[0] == "fen":
+                gs = GameState(" ".join(args[1:moves_at]))
+            else:
+                gs = GameState()
+            for text in args[moves_at + 1:]:
+                gs.makeMoveCode(parseUciMove(gs, text))
+        except (ValueError, KeyError, IndexError) as e:
+            self.send("info string bad position: %s" % (str(e) or " ".join(args)))
+            return
+        self.gs = gs
+    #------------------------------
+    def startSearch(self, args):
+        """
+        go [depth N] [movetime ms] [wtime ms btime ms winc ms binc ms movestogo N]
+        [nodes N] [infinite] [ponder]
+        """
+        limits = {}
+        for i, word in enumerate(args[:-1]):
+            if word in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes"):
+                try:
+                    limits[word] = int(args[i + 1])
+                except ValueError:
+                    pass
+        self.limits = limits
+        self.infinite = "infinite" in args or "ponder" in args
+        self.stopEvent.clear()
+        if self.book is not None and not self.infinite:
+            code = self.book.pickMove(self.gs)
+            if code is not None:
+                self.send("bestmove %s" % moveToUci(code))
+                return
+        time_limit = None if self.infinite else thinkingTime(self.gs.whiteToMove, limits)
+        depth = limits.get('depth', 64)
+        self.search = asyncio.ensure_future(self.searchAndReply(time_limit, depth, limits.get('nodes')))
+    #------------------------------
+    async def searchAndReply(self, timeLimit, depth, nodeLimit):
+        """
+        Search in a thread, sending info lines as iterations finish, then bestmove
+        """
+        gs = self.gs
+        start = time.perf_counter()
+        white_to_move = gs.whiteToMove
+
+        def report(result):  # Called in the search thread
+            elapsed = time.perf_counter() - start
+            line = "info depth %d score %s nodes %d nps %d time %d pv %s" % (
+                result.depth, formatScore(result.score, white_to_move), result.nodes,
+                result.nodes / max(elapsed, 1e-9), elapsed * 1000, " ".join(moveToUci(code) for code in result.pv))
+            self.loop.call_soon_threadsafe(self.send, line)
+
+        self.searcher.onIteration = report
+        ply_count = len(gs.moveCodeLog)
+        try:
+            move = (await asyncio.to_thread(self.searcher.iterativeDeepening, gs, timeLimit, depth, nodeLimit)).move
+        except Exception as e:  # Never leave the GUI waiting for a bestmove
+            self.send("info string search failed: %s: %s" % (type(e).__name__, e))
+            while len(gs.moveCodeLog) > ply_count:  # Take back what the search left made
+                gs.undoMove()
+            move = None
+        if self.infinite:  # The GUI decides when an infinite search is over
+            await self.stopEvent.wait()
+        self.send("bestmove %s" % (moveToUci(move) if move is not None else "0000"))
+    #------------------------------
+    def ponderHit(self):
+        """
+        The opponent played the move we were pondering on: from now on the search
+        runs on our own clock, and stops at once when there are no clock limits
+        """
+        if self.search is None:
+            return
+        self.infinite = False
+        self.stopEvent.set()
+        time_limit = thinkingTime(self.gs.whiteToMove, self.limits)
+        if time_limit is None:
+            self.searcher.stop()
+        else:
+            self.searcher.deadline = time.perf_counter() + time_limit
+    #------------------------------
+    async def stopSearch(self):
+        """
+        End the running search, if any, and wait for its bestmove to go out
+        """
+        if self.search is None:
+            return
+        self.stopEvent.set()
+        while not self.search.done():  # Repeat: a search only just starting resets its stop request
+            self.searcher.stop()
+            await asyncio.wait([self.search], timeout=0.05)
+        self.search = None
+    #------------------------------
+    def closeFiles(self):
+        """
+        Close the book, the tablebases and the stats log
+        """
+        if self.book:
+            self.book.close()
+        if self.tablebase:
+            self.tablebase.close()
+        if self.statsLog:
+            self.statsLog.close()
+#------------------------------
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if "--startup" in argv:  # Time to the first uciok, as a GUI would see it
+        engine = UCIEngine(open(os.devnull, "w"))
+        asyncio.run(engine.handle("uci"))
+        print("%.1f ms" % ((time.perf_counter() - START_TIME) * 1000))
+        return 0
+    asyncio.run(UCIEngine().run())
+    return 0
+#---------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    sys.exit(main())